@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import random
+import time
+
+import numpy as np
+
+from Search import Node, Searcher, StateSpace
+
+
+class CompiledStateSpace(StateSpace):
+    def __init__(self, state_space: StateSpace | dict):
+        """
+        Interns every state of a dict based state space as an integer id (its index in states),
+        and stores the edges in compressed sparse row form:
+        the successors of the state with id i are targets[offsets[i]:offsets[i + 1]].
+
+        States that only appear as a successor get an id with no successors.
+        """
+        if isinstance(state_space, StateSpace):
+            state_space = state_space.state_space
+        super().__init__(state_space)
+
+        self.states: list = list(state_space.keys())
+        self.index: dict = {state: i for i, state in enumerate(self.states)}
+        targets = []
+        offsets = [0]
+        for children in state_space.values():
+            for child in children:
+                if child not in self.index:
+                    self.index[child] = len(self.states)
+                    self.states.append(child)
+                targets.append(self.index[child])
+            offsets.append(len(targets))
+        # States without a row of their own have no successors
+        offsets.extend([len(targets)] * (len(self.states) + 1 - len(offsets)))
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.targets = np.array(targets, dtype=np.int64)
+
+    def successor(self, state) -> list:
+        i = self.index[state]
+        return [self.states[t] for t in self.targets[self.offsets[i]:self.offsets[i + 1]]]
+
+    def successor_ids(self, ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the successors of all the given state ids, and for each successor the id it was generated from.
+
+        Successors are ordered by the position of their parent in ids, and then by their order in the state space"""
+        starts = self.offsets[ids]
+        counts = self.offsets[ids + 1] - starts
+        total = int(counts.sum())
+        # The position of every edge in its own row, added to the start of that row
+        row_starts = np.repeat(np.cumsum(counts) - counts, counts)
+        edges = np.arange(total, dtype=np.int64) - row_starts + np.repeat(starts, counts)
+        return self.targets[edges], np.repeat(ids, counts)
+
+    def path_to(self, goal_id: int, parents: np.ndarray) -> list[Node]:
+        """Follows the parent ids from goal_id back to the root (parent -1), and returns the path as Node.path() does"""
+        ids = [goal_id]
+        while parents[ids[-1]] != -1:
+            ids.append(int(parents[ids[-1]]))
+
+        node = None
+        for depth, i in enumerate(reversed(ids)):
+            node = Node(self.states[i], node, depth)
+        return node.path()
+
+
+class CompiledSearcher(Searcher):
+    def __init__(self, initial_state, goal_state, state_space: StateSpace | dict = None, verbose: bool = True):
+        """Searcher that compiles its state space to a CompiledStateSpace, and runs graph_search on the integer ids"""
+        if not isinstance(state_space, CompiledStateSpace):
+            state_space = CompiledStateSpace(state_space)
+        super().__init__(initial_state, goal_state, state_space, verbose)
+
+    def graph_search(self, depth_first: bool = True) -> list[Node]:
+        """Same as Searcher.graph_search, but on the compiled state space.
+
+        Parent pointers are kept in an int array, and states are only translated back when the path is built.
+        The number of pruned children is stored in pruned_count"""
+        space: CompiledStateSpace = self.state_space
+        self.pruned_count = 0
+        if self.initial_state == self.goal_state:
+            return Node(self.initial_state).path()
+        if self.initial_state not in space.index or self.goal_state not in space.index:
+            return []
+
+        start = space.index[self.initial_state]
+        goal = space.index[self.goal_state]
+        parents = np.full(len(space.states), -1, dtype=np.int64)
+        if depth_first:
+            found = self.depth_first_ids(start, goal, parents)
+        else:
+            found = self.breadth_first_ids(start, goal, parents)
+
+        return space.path_to(goal, parents) if found else []
+
+    def breadth_first_ids(self, start: int, goal: int, parents: np.ndarray) -> bool:
+        """Level synchronous breadth-first search, a whole level of the search is expanded with array operations"""
+        space: CompiledStateSpace = self.state_space
+        reached = np.zeros(len(space.states), dtype=bool)
+        reached[start] = True
+        fringe = np.array([start], dtype=np.int64)
+        depth = 0
+        while fringe.size > 0:
+            children, children_parents = space.successor_ids(fringe)
+            new = ~reached[children]
+            children, children_parents = children[new], children_parents[new]
+            # Keep the first time each state was generated in this level
+            _, first = np.unique(children, return_index=True)
+            first.sort()
+            self.pruned_count += len(new) - len(first)
+            fringe = children[first]
+            reached[fringe] = True
+            parents[fringe] = children_parents[first]
+            depth += 1
+            if self.verbose:
+                print(f"Level {depth}: {fringe.size} states")
+            if reached[goal]:
+                return True
+
+        return False
+
+    def depth_first_ids(self, start: int, goal: int, parents: np.ndarray) -> bool:
+        """Depth-first search with the stack held in two preallocated int arrays (state id and parent id).
+
+        Every state is expanded at most once, so at most one entry per edge is ever pushed"""
+        space: CompiledStateSpace = self.state_space
+        expanded = np.zeros(len(space.states), dtype=bool)
+        stack_states = np.empty(len(space.targets) + 1, dtype=np.int64)
+        stack_parents = np.empty(len(space.targets) + 1, dtype=np.int64)
+        stack_states[0], stack_parents[0] = start, -1
+        top = 1
+        while top > 0:
+            top -= 1
+            state = stack_states[top]
+            if expanded[state]:
+                self.pruned_count += 1
+                continue
+            expanded[state] = True
+            parents[state] = stack_parents[top]
+            if state == goal:
+                return True
+
+            children = space.targets[space.offsets[state]:space.offsets[state + 1]]
+            new = ~expanded[children]
+            self.pruned_count += len(children) - int(new.sum())
+            # Reversed, so the first successor is on top of the stack and expanded first
+            children = children[new][::-1]
+            stack_states[top:top + len(children)] = children
+            stack_parents[top:top + len(children)] = state
+            top += len(children)
+
+        return False
+
+
+if __name__ == '__main__':
+    vacuum_space = {
+        ('A', 'Dirty', 'Dirty'): [('A', 'Clean', 'Dirty'), ('A', 'Dirty', 'Dirty'), ('B', 'Dirty', 'Dirty')],
+        ('B', 'Dirty', 'Dirty'): [('B', 'Dirty', 'Clean'), ('A', 'Dirty', 'Dirty'), ('B', 'Dirty', 'Dirty')],
+        ('B', 'Dirty', 'Clean'): [('B', 'Dirty', 'Clean'), ('A', 'Dirty', 'Clean')],
+        ('A', 'Dirty', 'Clean'): [('B', 'Dirty', 'Clean'), ('A', 'Clean', 'Clean'), ('A', 'Dirty', 'Clean')],
+        ('A', 'Clean', 'Dirty'): [('B', 'Clean', 'Dirty'), ('A', 'Clean', 'Dirty')],
+        ('B', 'Clean', 'Dirty'): [('B', 'Clean', 'Dirty'), ('A', 'Clean', 'Dirty'), ('A', 'Clean', 'Clean')],
+        ('B', 'Clean', 'Clean'): [('B', 'Clean', 'Clean'), ('A', 'Clean', 'Clean')],
+        ('A', 'Clean', 'Clean'): [('B', 'Clean', 'Clean'), ('A', 'Clean', 'Clean')],
+    }
+
+    print("Vacuum world (compiled)")
+    searcher = CompiledSearcher(initial_state=('A', 'Dirty', 'Dirty'), goal_state=('B', 'Clean', 'Clean'),
+                                state_space=StateSpace(vacuum_space))
+    print("Depth-first")
+    searcher.run(depth_first=True, graph_search=True)
+    print("Breadth-first")
+    searcher.run(depth_first=False, graph_search=True)
+
+    print("Random state space with 200000 tuple states")
+    random.seed(0)
+    size = 200_000
+    names = [('S', i // 1000, i % 1000) for i in range(size)]
+    random_space = {name: [names[random.randrange(size)] for _ in range(3)] for name in names}
+    goal = names[random.randrange(size)]
+
+    start_time = time.perf_counter_ns()
+    searcher = Searcher(names[0], goal, StateSpace(random_space), verbose=False)
+    path = searcher.graph_search(depth_first=False)
+    end_time = time.perf_counter_ns()
+    print(f"graph_search: path length {len(path)} in {(end_time - start_time) / 10 ** 6} ms")
+
+    start_time = time.perf_counter_ns()
+    compiled_space = CompiledStateSpace(random_space)
+    end_time = time.perf_counter_ns()
+    print(f"Compiling the state space took {(end_time - start_time) / 10 ** 6} ms")
+
+    start_time = time.perf_counter_ns()
+    searcher = CompiledSearcher(names[0], goal, compiled_space, verbose=False)
+    path = searcher.graph_search(depth_first=False)
+    end_time = time.perf_counter_ns()
+    print(f"Compiled breadth-first: path length {len(path)} in {(end_time - start_time) / 10 ** 6} ms")
+
+    start_time = time.perf_counter_ns()
+    path = searcher.graph_search(depth_first=True)
+    end_time = time.perf_counter_ns()
+    print(f"Compiled depth-first: path length {len(path)} in {(end_time - start_time) / 10 ** 6} ms")
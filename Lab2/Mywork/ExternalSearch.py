@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+from typing import Callable
+
+import numpy as np
+
+from Search import ImplicitStateSpace, Node, Searcher, StateSpace, vacuum_successors
+
+# Every state is written to disk as a fixed width record, together with the state it was generated from
+record_type = np.dtype([('state', '<u8'), ('parent', '<u8')])
+
+
+class ExternalSearcher(Searcher):
+    def __init__(self, initial_state, goal_state, state_space: StateSpace, encode: Callable[[object], int],
+                 decode: Callable[[int], object], directory: str = None, chunk_size: int = 1 << 20,
+                 state_bits: int = 64, bucket_bits: int = 6, verbose: bool = True):
+        """
+        Searcher that runs breadth-first search out of core, with every layer of the search kept on disk.
+
+        encode must map every state to a unique int below 2 ** state_bits, and decode must reverse it.
+        The layer files are written to directory (a temporary directory that is removed afterwards if None).
+        At most chunk_size states of a layer are expanded at a time, and the children are spread over
+        2 ** bucket_bits bucket files by their top bits, so only one bucket has to fit in memory at a time.
+        """
+        super().__init__(initial_state, goal_state, state_space, verbose)
+        self.encode = encode
+        self.decode = decode
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.state_bits = state_bits
+        self.bucket_bits = bucket_bits
+        self.layer_sizes: list[int] = []
+
+    def graph_search(self, depth_first: bool = False) -> list[Node]:
+        """Breadth-first runs external_breadth_first_search, depth-first falls back to the in memory graph_search"""
+        if depth_first:
+            return super().graph_search(depth_first)
+        return self.external_breadth_first_search()
+
+    def external_breadth_first_search(self) -> list[Node]:
+        """Breadth-first search with delayed duplicate detection.
+
+        Layer d is stored as layer_d.bin, sorted by state, and is read back through a memory map.
+        The children of a layer are first written unsorted to bucket files, then every bucket is sorted,
+        deduplicated and merged against the same range of all previous layers, and appended to the next layer.
+        The solution path is rebuilt by looking up the parent of each state in the layer before it.
+        The number of pruned duplicate children is stored in pruned_count"""
+        self.pruned_count = 0
+        self.layer_sizes = []
+        if self.directory is None:
+            with tempfile.TemporaryDirectory() as directory:
+                return self.search_in(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        return self.search_in(self.directory)
+
+    def search_in(self, directory: str) -> list[Node]:
+        initial_code = self.encode(self.initial_state)
+        goal_code = self.encode(self.goal_state)
+        for code in [initial_code, goal_code]:
+            if not 0 <= code < 1 << self.state_bits:
+                raise Exception(f"The state code {code} does not fit in {self.state_bits} state bits")
+        np.array([(initial_code, initial_code)], dtype=record_type).tofile(self.layer_path(directory, 0))
+        self.layer_sizes.append(1)
+
+        depth = 0
+        while True:
+            if self.find_record(self.read_layer(directory, depth), goal_code) is not None:
+                return self.rebuild_path(directory, depth, goal_code)
+            if self.layer_sizes[depth] == 0:
+                return []
+
+            self.expand_layer(directory, depth)
+            depth += 1
+            if self.verbose:
+                print(f"Layer {depth}: {self.layer_sizes[depth]} states")
+
+    def layer_path(self, directory: str, depth: int) -> str:
+        return os.path.join(directory, f"layer_{depth}.bin")
+
+    def read_layer(self, directory: str, depth: int) -> np.ndarray:
+        """Memory maps the layer file (an empty array if the layer is empty)"""
+        if self.layer_sizes[depth] == 0:
+            return np.empty(0, dtype=record_type)
+        return np.memmap(self.layer_path(directory, depth), dtype=record_type, mode='r')
+
+    def find_record(self, layer: np.ndarray, code: int):
+        """Binary search for the record of the state code in a sorted layer, returns None if it is not there"""
+        states = layer['state']
+        i = np.searchsorted(states, np.uint64(code))
+        if i < len(states) and states[i] == code:
+            return layer[i]
+        return None
+
+    def expand_layer(self, directory: str, depth: int) -> None:
+        """Generates all children of layer depth, and writes the new ones as layer depth + 1"""
+        shift = self.state_bits - self.bucket_bits
+        bucket_count = 1 << self.bucket_bits
+        bucket_paths = [os.path.join(directory, f"bucket_{b}.bin") for b in range(bucket_count)]
+        bucket_files = [open(path, 'wb') for path in bucket_paths]
+
+        layer = self.read_layer(directory, depth)
+        for start in range(0, len(layer), self.chunk_size):
+            children = []
+            parents = []
+            for code in layer['state'][start:start + self.chunk_size].tolist():
+                for child in self.state_space.successor(self.decode(code)):
+                    children.append(self.encode(child))
+                    parents.append(code)
+            records = np.empty(len(children), dtype=record_type)
+            records['state'] = children
+            records['parent'] = parents
+
+            buckets = (records['state'] >> np.uint64(shift)).astype(np.int64)
+            if len(buckets) > 0 and buckets.max() >= bucket_count:
+                for bucket_file in bucket_files:
+                    bucket_file.close()
+                raise Exception(f"The state code {int(records['state'].max())} does not fit in "
+                                f"{self.state_bits} state bits")
+            records = records[np.argsort(buckets, kind='stable')]
+            ends = np.cumsum(np.bincount(buckets, minlength=bucket_count))
+            for b in range(bucket_count):
+                records[ends[b - 1] if b > 0 else 0:ends[b]].tofile(bucket_files[b])
+        del layer
+
+        for bucket_file in bucket_files:
+            bucket_file.close()
+
+        previous_layers = [self.read_layer(directory, d) for d in range(depth + 1)]
+        size = 0
+        with open(self.layer_path(directory, depth + 1), 'wb') as layer_file:
+            for b, path in enumerate(bucket_paths):
+                records = np.fromfile(path, dtype=record_type)
+                os.remove(path)
+                generated = len(records)
+                records = records[np.argsort(records['state'], kind='stable')]
+                first = np.ones(len(records), dtype=bool)
+                first[1:] = records['state'][1:] != records['state'][:-1]
+                records = records[first]
+
+                for previous_layer in previous_layers:
+                    records = records[~self.in_bucket_of(previous_layer, records['state'], b, shift)]
+
+                self.pruned_count += generated - len(records)
+                records.tofile(layer_file)
+                size += len(records)
+        self.layer_sizes.append(size)
+
+    def in_bucket_of(self, layer: np.ndarray, codes: np.ndarray, bucket: int, shift: int) -> np.ndarray:
+        """Returns a mask of the (sorted) codes that are in the layer, only reading the range of the layer in bucket"""
+        states = layer['state']
+        low = np.searchsorted(states, np.uint64(bucket << shift))
+        high = len(states) if bucket + 1 == 1 << self.bucket_bits else \
+            np.searchsorted(states, np.uint64((bucket + 1) << shift))
+        existing = np.asarray(states[low:high])
+        if len(existing) == 0 or len(codes) == 0:
+            return np.zeros(len(codes), dtype=bool)
+        positions = np.minimum(np.searchsorted(existing, codes), len(existing) - 1)
+        return existing[positions] == codes
+
+    def rebuild_path(self, directory: str, depth: int, goal_code: int) -> list[Node]:
+        codes = [goal_code]
+        for d in range(depth, 0, -1):
+            record = self.find_record(self.read_layer(directory, d), codes[-1])
+            codes.append(int(record['parent']))
+
+        node = None
+        for d, code in enumerate(reversed(codes)):
+            node = Node(self.decode(code), node, d)
+        return node.path()
+
+
+def vacuum_codec(size: int) -> tuple[Callable[[tuple], int], Callable[[int], tuple]]:
+    """Returns an (encode, decode) pair for vacuum_successors states with size locations.
+
+    The status of every location is one bit (1 for Dirty), and the index of the location is stored above them"""
+
+    def encode(state: tuple) -> int:
+        location, *statuses = state
+        code = ord(location) - ord('A')
+        for status in reversed(statuses):
+            code = code << 1 | (status == 'Dirty')
+        return code
+
+    def decode(code: int) -> tuple:
+        statuses = tuple('Dirty' if code >> i & 1 else 'Clean' for i in range(size))
+        return chr(ord('A') + (code >> size)), *statuses
+
+    return encode, decode
+
+
+if __name__ == '__main__':
+    size = 14
+    encode, decode = vacuum_codec(size)
+    initial_state, goal_state = ('A', *['Dirty'] * size), (chr(ord('A') + size - 1), *['Clean'] * size)
+
+    print(f"Vacuum world with {size} locations (in memory)")
+    start_time = time.perf_counter_ns()
+    searcher = Searcher(initial_state, goal_state, ImplicitStateSpace(vacuum_successors), verbose=False)
+    path = searcher.graph_search(depth_first=False)
+    end_time = time.perf_counter_ns()
+    print(f"Path length {len(path)} in {(end_time - start_time) / 10 ** 6} ms")
+
+    print(f"Vacuum world with {size} locations (external memory)")
+    start_time = time.perf_counter_ns()
+    searcher = ExternalSearcher(initial_state, goal_state, ImplicitStateSpace(vacuum_successors), encode, decode,
+                                chunk_size=10_000, state_bits=size + 4, bucket_bits=4)
+    path = searcher.graph_search(depth_first=False)
+    end_time = time.perf_counter_ns()
+    print(f"Path length {len(path)} in {(end_time - start_time) / 10 ** 6} ms, pruned {searcher.pruned_count}")
+    searcher.show_path(path)
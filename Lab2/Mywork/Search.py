@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+from collections import OrderedDict, deque
+from typing import Callable, Iterable
+
 
 class Node:
     def __init__(self, state, parent: Node = None, depth: int = 0):
@@ -16,12 +19,12 @@ class Node:
 
         return path
 
-    def expand(self, state_space: StateSpace):
-        successors = []
+    def expand(self, state_space: StateSpace) -> Fringe:
+        successors = Fringe()
         children = state_space.successor(self.state)
         for child in children:
             s = Node(child, self, self.depth + 1)
-            successors = insert(s, successors)
+            successors.insert(s)
 
         return successors
 
@@ -32,32 +35,61 @@ class Node:
         return f"State: {self.state} - Depth: {self.depth}"
 
 
-def insert(node: Node, queue: list[Node], insert_as_first: bool = True) -> list[Node]:
-    """Returns a copy of the queue with the node inserted (the fringe)"""
-    out = queue.copy()
+def insert(node: Node, queue: deque[Node], insert_as_first: bool = True) -> deque[Node]:
+    """Inserts the node into the queue (the fringe) in O(1) and returns the queue"""
     if insert_as_first:
-        out.insert(0, node)  # inserts in the beginning (Depth-first search)
+        queue.appendleft(node)  # inserts in the beginning (Depth-first search)
     else:
-        out.append(node)  # inserts at the end (Breadth first search)
-    return out
+        queue.append(node)  # inserts at the end (Breadth first search)
+    return queue
 
 
-def insert_all(in_list: list[Node], queue: list, insert_as_first: bool = True) -> list[Node]:
+def insert_all(in_list: Iterable[Node], queue: deque[Node], insert_as_first: bool = True) -> deque[Node]:
     """Inserts all nodes from the input list, into the queue using the insert function defined in this script"""
     for node in in_list:
-        queue = insert(node, queue, insert_as_first)
+        insert(node, queue, insert_as_first)
 
     return queue
 
 
-def remove_first(queue: list[Node]) -> Node:
-    """Removes and returns the first element from the input list"""
-    return queue.pop(0)
+def remove_first(queue: deque[Node]) -> Node:
+    """Removes and returns the first element from the input queue"""
+    return queue.popleft()
+
+
+class Fringe:
+    def __init__(self, nodes: Iterable[Node] = (), insert_as_first: bool = True):
+        """
+        The successor list of a search, backed by a deque so insertions and removals are O(1).
+        If insert_as_first is True the fringe is LIFO (depth-first), otherwise it is FIFO (breadth-first).
+        """
+        self.queue: deque[Node] = deque()
+        self.insert_as_first = insert_as_first
+        self.insert_all(nodes)
+
+    def insert(self, node: Node) -> None:
+        insert(node, self.queue, self.insert_as_first)
+
+    def insert_all(self, nodes: Iterable[Node]) -> None:
+        insert_all(nodes, self.queue, self.insert_as_first)
+
+    def remove_first(self) -> Node:
+        return remove_first(self.queue)
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def __iter__(self):
+        return iter(self.queue)
+
+    def __repr__(self) -> str:
+        return repr(list(self.queue))
 
 
 class StateSpace:
     def __init__(self, state_space: dict = None):
         self.state_space = state_space
+        self.reverse_state_space: dict | None = None
 
     def successor(self, state: str):
         if self.state_space is None:
@@ -65,31 +97,345 @@ class StateSpace:
 
         return self.state_space[state]
 
+    def build_reverse_index(self) -> dict:
+        """Builds (only the first time) and returns a dict mapping each state to the states it is a successor of"""
+        if self.reverse_state_space is None:
+            self.reverse_state_space = {}
+            for state, children in self.state_space.items():
+                for child in children:
+                    self.reverse_state_space.setdefault(child, []).append(state)
+
+        return self.reverse_state_space
+
+    def predecessor(self, state: str):
+        return self.build_reverse_index().get(state, [])
+
+
+class ImplicitStateSpace(StateSpace):
+    def __init__(self, successor_fn: Callable[[object], Iterable], predecessor_fn: Callable[[object], Iterable] = None):
+        """
+        A state space that is never written out as a dict.
+        The successors of a state are generated lazily by successor_fn when the state is expanded,
+        so only the states a search actually reaches are ever created.
+        predecessor_fn is only needed by bidirectional_search.
+        """
+        super().__init__()
+        self.successor_fn = successor_fn
+        self.predecessor_fn = predecessor_fn
+
+    def successor(self, state) -> Iterable:
+        return self.successor_fn(state)
+
+    def build_reverse_index(self) -> dict:
+        raise Exception("An implicit state space cannot be enumerated, set a predecessor_fn instead")
+
+    def predecessor(self, state) -> Iterable:
+        if self.predecessor_fn is None:
+            raise Exception("No predecessor function set")
+        return self.predecessor_fn(state)
+
+
+def vacuum_successors(state: tuple):
+    """Successor function for the vacuum world, the state is (location, A status, B status, ...).
+
+    Works for a row of any number of locations (named 'A', 'B', ...).
+    Yields the states after Suck, Left and Right, leaving out the actions that do not change the state"""
+    location, *statuses = state
+    index = ord(location) - ord('A')
+    if statuses[index] == 'Dirty':
+        yield location, *statuses[:index], 'Clean', *statuses[index + 1:]
+    if index > 0:
+        yield chr(ord(location) - 1), *statuses
+    if index < len(statuses) - 1:
+        yield chr(ord(location) + 1), *statuses
+
+
+def farmer_is_safe(state: tuple) -> bool:
+    """Returns False if the wolf can eat the goat or the goat can eat the cabbage (farmer, wolf, goat, cabbage)"""
+    farmer, wolf, goat, cabbage = state
+    return not (wolf == goat != farmer or goat == cabbage != farmer)
+
+
+def farmer_successors(state: tuple):
+    """Successor function for the farmer, wolf, goat and cabbage puzzle, the state is (farmer, wolf, goat, cabbage).
+
+    The farmer crosses alone or with one passenger from his side of the river, only safe states are yielded.
+    Every crossing can be undone, so this is also the predecessor function of the safe states"""
+    other_side = 'E' if state[0] == 'W' else 'W'
+    for passenger in range(len(state)):
+        if state[passenger] != state[0]:
+            continue
+        child = tuple(other_side if i in (0, passenger) else side for i, side in enumerate(state))
+        if farmer_is_safe(child):
+            yield child
+
+
+def path_from_states(states: list) -> list[Node]:
+    """Builds the nodes for a list of states from the initial state to the goal, and returns them as Node.path() does"""
+    node = None
+    for depth, state in enumerate(states):
+        node = Node(state, node, depth)
+    return node.path()
+
+
+class ShortestPathCache:
+    def __init__(self, state_space: StateSpace, max_trees: int = 64):
+        """
+        Answers shortest path queries on a state space that does not change between queries.
+
+        The first query from a start state runs a full breadth-first search and keeps its tree of parent pointers,
+        later queries from the same start state only walk the parent pointers back from the goal.
+        At most max_trees trees are kept, the least recently used tree is evicted first.
+        """
+        self.state_space = state_space
+        self.max_trees = max_trees
+        self.trees: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def breadth_first_tree(self, source) -> dict:
+        """Maps every state reachable from source to its parent on a shortest path (the parent of source is None)"""
+        parents = {source: None}
+        fringe = deque([source])
+        while fringe:
+            state = fringe.popleft()
+            for child in self.state_space.successor(state):
+                if child not in parents:
+                    parents[child] = state
+                    fringe.append(child)
+        return parents
+
+    def tree(self, source) -> dict:
+        if source in self.trees:
+            self.hits += 1
+            self.trees.move_to_end(source)
+            return self.trees[source]
+
+        self.misses += 1
+        parents = self.breadth_first_tree(source)
+        self.trees[source] = parents
+        if len(self.trees) > self.max_trees:
+            self.trees.popitem(last=False)
+            self.evictions += 1
+        return parents
+
+    def shortest_path(self, initial_state, goal_state) -> list[Node]:
+        """Returns a shortest path from initial_state to goal_state in the format of Node.path(), [] if there is none"""
+        parents = self.tree(initial_state)
+        if goal_state not in parents:
+            return []
+
+        states = []
+        state = goal_state
+        while state is not None:
+            states.append(state)
+            state = parents[state]
+        states.reverse()
+        return path_from_states(states)
+
+    def precompute_all_pairs(self) -> None:
+        """Builds the tree of every state in a (small) dict state space, and raises max_trees to keep all of them"""
+        self.max_trees = max(self.max_trees, len(self.state_space.state_space))
+        for state in self.state_space.state_space:
+            if state not in self.trees:
+                self.trees[state] = self.breadth_first_tree(state)
+
+    def hit_rate(self) -> float:
+        queries = self.hits + self.misses
+        return self.hits / queries if queries > 0 else 0
+
 
 class Searcher:
-    def __init__(self, initial_state, goal_state, state_space: StateSpace = None):
+    def __init__(self, initial_state, goal_state, state_space: StateSpace = None, verbose: bool = True,
+                 path_cache: ShortestPathCache = None):
+        """Printing the fringe after every expansion is O(fringe), so set verbose to False for large searches.
+
+        path_cache can be shared between searchers on the same state space, and is used by cached_search"""
         self.initial_state = initial_state
         self.goal_state = goal_state
         self.state_space = state_space
+        self.path_cache = path_cache
+        self.verbose = verbose
+        self.pruned_count = 0
+        self.generated_per_depth: list[int] = []
+        self.expanded_count = 0
 
     def tree_search(self, depth_first: bool = True) -> list[Node]:
         """Search the tree for the goal state
         and return the path from the initial state to the goal state.
 
         If depth_first is False, then the tree_search will use breadth-first instead"""
-        fringe = []
+        fringe = Fringe(insert_as_first=depth_first)
         initial_node = Node(self.initial_state)
-        fringe = insert(initial_node, fringe)
-        while fringe is not None:
-            node = remove_first(fringe)
+        fringe.insert(initial_node)
+        while fringe:
+            node = fringe.remove_first()
             if node.state == self.goal_state:
                 return node.path()
             children = node.expand(self.state_space)
-            fringe = insert_all(children, fringe, depth_first)
-            print(f"Fringe: {fringe}")
+            fringe.insert_all(children)
+            if self.verbose:
+                print(f"Fringe: {fringe}")
+
+        return []
+
+    def graph_search(self, depth_first: bool = True) -> list[Node]:
+        """Same as tree_search, but every state is expanded at most once.
+
+        Children whose state has already been explored or is waiting in the fringe are pruned,
+        the number of pruned children is stored in pruned_count"""
+        fringe = Fringe(insert_as_first=depth_first)
+        initial_node = Node(self.initial_state)
+        fringe.insert(initial_node)
+        explored = set()
+        in_fringe = {initial_node.state}
+        self.pruned_count = 0
+        while fringe:
+            node = fringe.remove_first()
+            in_fringe.discard(node.state)
+            if node.state == self.goal_state:
+                return node.path()
+            explored.add(node.state)
+            for child in node.expand(self.state_space):
+                if child.state in explored or child.state in in_fringe:
+                    self.pruned_count += 1
+                    continue
+                fringe.insert(child)
+                in_fringe.add(child.state)
+            if self.verbose:
+                print(f"Fringe: {fringe}")
+
+        return []
+
+    def depth_limited_search(self, limit: int) -> tuple[list[Node], int, bool]:
+        """Depth-first search that never expands nodes at a depth of limit or more.
+
+        Only the current path and an iterator over each of its nodes' successors is kept in memory.
+        States already on the current path are skipped, so cycles in the state space cannot trap the search.
+
+        Returns a tuple containing:
+        (path to the goal or [], number of generated nodes, whether any node was cut off by the limit)"""
+        root = Node(self.initial_state)
+        if root.state == self.goal_state:
+            return root.path(), 1, False
+
+        generated = 1
+        on_path = {root.state}
+        stack = [(root, iter(self.state_space.successor(root.state)))] if limit > 0 else []
+        cut_off = limit == 0
+        while stack:
+            node, children = stack[-1]
+            for child_state in children:
+                if child_state in on_path:
+                    continue
+                child = Node(child_state, node, node.depth + 1)
+                generated += 1
+                if child.state == self.goal_state:
+                    return child.path(), generated, cut_off
+                if child.depth < limit:
+                    on_path.add(child.state)
+                    stack.append((child, iter(self.state_space.successor(child.state))))
+                    break
+                cut_off = True
+            else:
+                stack.pop()
+                on_path.discard(node.state)
 
-    def run(self, depth_first: bool = True):
-        path = self.tree_search(depth_first)
+        return [], generated, cut_off
+
+    def iterative_deepening_search(self, max_depth: int) -> list[Node]:
+        """Runs depth_limited_search with the limits 0, 1, ..., max_depth and returns the first path found.
+
+        This finds the shallowest goal like breadth-first search, while only using memory proportional to the depth.
+        The number of nodes generated by each iteration is stored in generated_per_depth"""
+        self.generated_per_depth = []
+        for limit in range(max_depth + 1):
+            path, generated, cut_off = self.depth_limited_search(limit)
+            self.generated_per_depth.append(generated)
+            if self.verbose:
+                print(f"Depth limit {limit}: generated {generated} nodes")
+            if path or not cut_off:
+                return path
+
+        return []
+
+    def bidirectional_search(self) -> list[Node]:
+        """Breadth-first search from both the initial state and the goal state, that stops when the two searches meet.
+
+        The side with the smallest fringe expands a whole layer at a time, and the shortest path through all the
+        meeting states of that layer is returned, in the same format as Node.path().
+        The number of expanded states is stored in expanded_count"""
+        self.expanded_count = 0
+        if self.initial_state == self.goal_state:
+            return Node(self.initial_state).path()
+
+        # For each side: the parent of every reached state (towards the start of that side) and its depth
+        forward_parents, forward_depths = {self.initial_state: None}, {self.initial_state: 0}
+        backward_parents, backward_depths = {self.goal_state: None}, {self.goal_state: 0}
+        forward_fringe, backward_fringe = [self.initial_state], [self.goal_state]
+
+        def expand_layer(fringe: list, parents: dict, depths: dict, other_depths: dict,
+                         neighbours) -> tuple[list, object]:
+            next_fringe = []
+            meeting_state = None
+            for state in fringe:
+                self.expanded_count += 1
+                for neighbour in neighbours(state):
+                    if neighbour in parents:
+                        continue
+                    parents[neighbour] = state
+                    depths[neighbour] = depths[state] + 1
+                    next_fringe.append(neighbour)
+                    if neighbour in other_depths and (meeting_state is None or
+                                                      depths[neighbour] + other_depths[neighbour] <
+                                                      depths[meeting_state] + other_depths[meeting_state]):
+                        meeting_state = neighbour
+            return next_fringe, meeting_state
+
+        while forward_fringe and backward_fringe:
+            if len(forward_fringe) <= len(backward_fringe):
+                forward_fringe, meeting_state = expand_layer(forward_fringe, forward_parents, forward_depths,
+                                                             backward_depths, self.state_space.successor)
+            else:
+                backward_fringe, meeting_state = expand_layer(backward_fringe, backward_parents, backward_depths,
+                                                              forward_depths, self.state_space.predecessor)
+            if meeting_state is not None:
+                break
+        else:
+            return []
+
+        states = []
+        state = meeting_state
+        while state is not None:
+            states.append(state)
+            state = forward_parents[state]
+        states.reverse()
+        state = backward_parents[meeting_state]
+        while state is not None:
+            states.append(state)
+            state = backward_parents[state]
+
+        return path_from_states(states)
+
+    def cached_search(self) -> list[Node]:
+        """Returns a shortest path from path_cache, which only searches the first time a start state is queried"""
+        if self.path_cache is None:
+            self.path_cache = ShortestPathCache(self.state_space)
+        return self.path_cache.shortest_path(self.initial_state, self.goal_state)
+
+    def run(self, depth_first: bool = True, graph_search: bool = False, cached: bool = False):
+        if cached:
+            path = self.cached_search()
+            print(f"Cache hits: {self.path_cache.hits} - misses: {self.path_cache.misses}")
+        elif graph_search:
+            path = self.graph_search(depth_first)
+            print(f"Pruned {self.pruned_count} duplicate states")
+        else:
+            path = self.tree_search(depth_first)
+        self.show_path(path)
+
+    def show_path(self, path: list[Node]):
         print("Solution path:")
         for node in path:
             node.display()
@@ -133,6 +479,15 @@ if __name__ == '__main__':
     # searcher.run(depth_first=True)
     print("Breadth-first")
     searcher.run(depth_first=False)
+    print("Depth-first (graph search)")
+    searcher.run(depth_first=True, graph_search=True)
+    print("Breadth-first (graph search)")
+    searcher.run(depth_first=False, graph_search=True)
+    print("Iterative deepening")
+    searcher.show_path(searcher.iterative_deepening_search(max_depth=10))
+    print("Bidirectional")
+    searcher.show_path(searcher.bidirectional_search())
+    print(f"Expanded {searcher.expanded_count} states")
 
     # tuple_format = ("farmer", "wolf", "goat", "cabbage")  # W for west, E for East
     farmer_space = {
@@ -159,6 +514,17 @@ if __name__ == '__main__':
         ('W', 'E', 'W', 'E'): [('E', 'E', 'W', 'E'), ('E', 'E', 'E', 'E')],
     }
 
+    print("Vacuum world (cached queries)")
+    vacuum_cache = ShortestPathCache(StateSpace(vacuum_space), max_trees=4)
+    for goal in [('B', 'Clean', 'Clean'), ('A', 'Clean', 'Clean'), ('B', 'Dirty', 'Clean')]:
+        searcher = Searcher(initial_state=('A', 'Dirty', 'Dirty'), goal_state=goal, path_cache=vacuum_cache)
+        searcher.run(cached=True)
+    vacuum_cache.precompute_all_pairs()
+    searcher = Searcher(initial_state=('B', 'Dirty', 'Clean'), goal_state=('A', 'Clean', 'Clean'),
+                        path_cache=vacuum_cache)
+    searcher.run(cached=True)
+    print(f"Cache hit rate: {vacuum_cache.hit_rate()}")
+
     print("Farmer world")
     searcher = Searcher(initial_state=('W', 'W', 'W', 'W'), goal_state=('E', 'E', 'E', 'E'),
                         state_space=StateSpace(farmer_space))
@@ -166,3 +532,26 @@ if __name__ == '__main__':
     # searcher.run(depth_first=True)
     print("Breadth-first")
     searcher.run(depth_first=False)
+    print("Depth-first (graph search)")
+    searcher.run(depth_first=True, graph_search=True)
+    print("Breadth-first (graph search)")
+    searcher.run(depth_first=False, graph_search=True)
+    print("Iterative deepening")
+    searcher.show_path(searcher.iterative_deepening_search(max_depth=10))
+    print("Bidirectional")
+    searcher.show_path(searcher.bidirectional_search())
+    print(f"Expanded {searcher.expanded_count} states")
+
+    print("Farmer world (implicit)")
+    searcher = Searcher(initial_state=('W', 'W', 'W', 'W'), goal_state=('E', 'E', 'E', 'E'),
+                        state_space=ImplicitStateSpace(farmer_successors, farmer_successors), verbose=False)
+    print("Breadth-first (graph search)")
+    searcher.run(depth_first=False, graph_search=True)
+    print("Bidirectional")
+    searcher.show_path(searcher.bidirectional_search())
+
+    print("Vacuum world with 8 locations (implicit)")
+    searcher = Searcher(initial_state=('A', *['Dirty'] * 8), goal_state=('H', *['Clean'] * 8),
+                        state_space=ImplicitStateSpace(vacuum_successors), verbose=False)
+    print("Breadth-first (graph search)")
+    searcher.run(depth_first=False, graph_search=True)
@@ -1,5 +1,13 @@
+import heapq
+import math
+from typing import Iterable
+
 from Enums import StateTypes, Location, Action
 from Lab3.Assignment1.SearchState import EnvironmentState, SearchState
+# The fringe and the parallel search are shared with the searcher in Lab3/Mywork, which imports them as top level
+# modules (it is run from its own directory), so they stay there and are only imported from here
+from Lab3.Mywork.Fringe import BucketFringe
+from Lab3.Mywork.ParallelSearch import SearchProblem, hda_star
 
 test_environment = {
     Location.A: StateTypes.DIRTY,
@@ -9,62 +17,224 @@ test_environment = {
 }
 
 
-def insert_all(in_list: list[SearchState], queue: list, alpha: float = 1) -> list[SearchState]:
-    """Inserts all nodes from the input list, into the queue using the insert function defined in this script"""
-    for state in in_list:
-        queue = state.insert(queue, alpha)
-
-    return queue
-
-
-def remove_first(queue: list[SearchState]) -> SearchState:
-    """Removes and returns the first element from the input list"""
-    return queue.pop(0)
-
-
 class AStarAgent:
-    def __init__(self, start_position: Location, start_state_space: dict[Location: StateTypes]):
+    # The class of the search states, subclasses can change it to use another heuristic
+    search_state = SearchState
+
+    def __init__(self, start_position: Location, start_state_space: dict[Location: StateTypes],
+                 goal_state: EnvironmentState = None, verbose: bool = True):
+        """
+        goal_state is the environment to reach (all four locations clean if None).
+        If verbose, the fringe is printed after every expansion.
+        """
         self.current_position = start_position
 
         self.last_action = Action.NO_OP
 
-        self.goal_state = EnvironmentState({
-            Location.A: StateTypes.CLEAN,
-            Location.B: StateTypes.CLEAN,
-            Location.C: StateTypes.CLEAN,
-            Location.D: StateTypes.CLEAN,
-        })
+        if goal_state is None:
+            goal_state = EnvironmentState({
+                Location.A: StateTypes.CLEAN,
+                Location.B: StateTypes.CLEAN,
+                Location.C: StateTypes.CLEAN,
+                Location.D: StateTypes.CLEAN,
+            })
+        self.goal_state = goal_state
 
         self.state = EnvironmentState(start_state_space)
+        self.verbose = verbose
+        # Heuristic values learned by the real-time search, by SearchState.key
+        self.learned_heuristic: dict[int, float] = {}
 
-    def weighted_A_star(self, weight_alpha: float = 1) -> tuple[list[Action], int, int]:
+    def weighted_A_star(self, weight_alpha: float = 1, transposition_table: bool = True) \
+            -> tuple[list[Action], int, int]:
         """
         Returns a tuple containing:
         (List of actions, cost of the path, number of explored nodes)
+
+        With the transposition table, the lowest cost found so far is stored for every state (by SearchState.key),
+        and children that are not cheaper than that are dropped, as are fringe entries that have been beaten since
+        they were inserted. The number of dropped children is stored in pruned_count.
         """
-        fringe = []
+        # A bucket queue while the weighted sums times the heuristic scale are integers, otherwise a heap
+        fringe = BucketFringe(weight_alpha, scale=self.search_state.heuristic_scale)
 
-        initial_state = SearchState(self.state, self.current_position)
-        fringe = initial_state.insert(fringe, weight_alpha)
+        initial_state = self.search_state(self.state, self.current_position, alpha=weight_alpha)
+        fringe.insert(initial_state)
+        best_costs: dict[int, int] = {initial_state.key(): 0}
+        self.pruned_count = 0
 
         explored_node_count = 0
 
-        while fringe is not None:
-            node = remove_first(fringe)
+        while fringe:
+            node = fringe.remove_first()
+            if transposition_table and best_costs[node.key()] < node.cost:
+                continue
             if node.get_environment_state() == self.goal_state:
-                return node.path, len(node.path), explored_node_count
+                path = node.path
+                return path, len(path), explored_node_count
             children = self.expand_node(node, weight_alpha)
-            fringe = insert_all(children, fringe, weight_alpha)
+            if transposition_table:
+                children = self.new_or_cheaper(children, best_costs)
+            fringe.insert_all(children)
             explored_node_count += 1
-            print(f"Fringe {explored_node_count} (length: {len(fringe)}): {fringe}")
+            if self.verbose:
+                print(f"Fringe {explored_node_count} (length: {len(fringe)}): {fringe}")
 
         return [], -1, explored_node_count
 
+    def new_or_cheaper(self, children: list[SearchState], best_costs: dict[int, int]) -> list[SearchState]:
+        """Returns the children that reach their state cheaper than before, and records their costs"""
+        out = []
+        for child in children:
+            key = child.key()
+            if key in best_costs and best_costs[key] <= child.cost:
+                self.pruned_count += 1
+                continue
+            best_costs[key] = child.cost
+            out.append(child)
+        return out
+
+    def parallel_A_star(self, weight_alpha: float = 1, workers: int = 4) -> tuple[list[Action], int, int]:
+        """
+        Same as weighted_A_star with the transposition table, but run by hda_star in workers processes.
+        Returns a tuple containing:
+        (List of actions, cost of the path, number of explored nodes over all workers)
+        """
+        path, cost, explored_node_count = hda_star(VacuumProblem(self), workers, weight_alpha)
+        return [action for _, action, _ in path[1:]], cost, explored_node_count
+
+    def real_time_search(self, lookahead: int = 10, learned_heuristic: dict[int, float] = None,
+                         max_steps: int = 10 ** 5) -> tuple[list[Action], int, int]:
+        """
+        Real-time search (LRTA* with an A-star lookahead): the agent plans with at most lookahead expansions,
+        performs one action, and plans again from where it ended up, until the goal is reached.
+
+        learned_heuristic is updated with the learned values, pass the same dict to the next episode to keep them
+        (the agent's own learned_heuristic if None).
+        Returns a tuple containing:
+        (List of actions, cost of the path, number of explored nodes over all steps)
+        """
+        if learned_heuristic is not None:
+            self.learned_heuristic = learned_heuristic
+
+        path = []
+        explored_node_count = 0
+        while self.state != self.goal_state and len(path) < max_steps:
+            action, expanded = self.real_time_step(lookahead)
+            explored_node_count += expanded
+            if action == Action.NO_OP:
+                return path, -1, explored_node_count
+            path.append(action)
+
+        if self.state != self.goal_state:
+            return path, -1, explored_node_count
+        return path, len(path), explored_node_count
+
+    def real_time_step(self, lookahead: int) -> tuple[Action, int]:
+        """
+        Performs one action of the real-time search, and returns it with the number of expanded nodes.
+
+        A-star runs from the current state (with the learned heuristic) for at most lookahead expansions.
+        The heuristic of every expanded state is then raised to its distance to the fringe plus the heuristic there
+        (Dijkstra backwards from the fringe), and the agent takes the first action towards the best fringe state.
+        Returns NO_OP if the goal can't be reached.
+        """
+        root = self.learned(self.search_state(self.state, self.current_position))
+        fringe = BucketFringe(scale=self.search_state.heuristic_scale)
+        fringe.insert(root)
+        best_costs: dict[int, int] = {root.key(): 0}
+        expanded: dict[int, SearchState] = {}
+        # The keys of the expanded states that generated each state
+        predecessors: dict[int, list[int]] = {}
+
+        target = None
+        while fringe and len(expanded) < lookahead:
+            node = fringe.remove_first()
+            key = node.key()
+            if best_costs[key] < node.cost or key in expanded:
+                continue
+            if node.get_environment_state() == self.goal_state:
+                target = node
+                break
+            expanded[key] = node
+            for child in self.expand_node(node, 1):
+                child_key = child.key()
+                predecessors.setdefault(child_key, []).append(key)
+                if child_key in expanded or best_costs.get(child_key, math.inf) <= child.cost:
+                    continue
+                best_costs[child_key] = child.cost
+                fringe.insert(self.learned(child))
+
+        frontier = {} if target is None else {target.key(): target}
+        for node in fringe:
+            key = node.key()
+            if key not in expanded and best_costs[key] == node.cost:
+                frontier.setdefault(key, node)
+        self.learn(expanded, {key: self.goal_distance(state) for key, state in frontier.items()}, predecessors)
+
+        if target is None:
+            if not frontier:
+                return Action.NO_OP, len(expanded)
+            target = min(frontier.values(), key=lambda state: state.cost + self.goal_distance(state))
+        if target.parent is None:
+            return Action.NO_OP, len(expanded)
+
+        while target.parent.parent is not None:
+            target = target.parent
+        self.perform(target.action)
+        return target.action, len(expanded)
+
+    def learned(self, state: SearchState) -> SearchState:
+        """Replaces the heuristic of a fresh search state with its learned value (if there is one), returns the state"""
+        key = state.key()
+        if key in self.learned_heuristic:
+            state.heuristic = self.learned_heuristic[key]
+            state.f = state.cost + state.heuristic * state.alpha
+        return state
+
+    def goal_distance(self, state: SearchState) -> float:
+        """The heuristic of a state, but 0 in a goal state (where get_heuristic can still add 0.5)"""
+        return 0 if state.get_environment_state() == self.goal_state else state.heuristic
+
+    def learn(self, expanded: dict[int, SearchState], frontier: dict[int, float],
+              predecessors: dict[int, list[int]]) -> None:
+        """Sets the learned heuristic of the expanded states to the cheapest distance to a frontier state
+        plus its value (infinite if no frontier state can be reached), never lowering it"""
+        values = dict(frontier)
+        queue = [(value, key) for key, value in values.items()]
+        heapq.heapify(queue)
+        while queue:
+            value, key = heapq.heappop(queue)
+            if value > values[key]:
+                continue
+            for predecessor in predecessors.get(key, ()):
+                if predecessor in expanded and value + 1 < values.get(predecessor, math.inf):
+                    values[predecessor] = value + 1
+                    heapq.heappush(queue, (value + 1, predecessor))
+
+        for key, state in expanded.items():
+            self.learned_heuristic[key] = max(state.heuristic, values.get(key, math.inf))
+
+    def policy_action(self, policy) -> Action:
+        """Looks up the best action for the current state in a PolicyTable (O(1), no search), and performs it"""
+        action = policy.best_action(self.state, self.current_position)
+        self.perform(action)
+        return action
+
+    def perform(self, action: Action) -> None:
+        """Updates the position and the environment of the agent after it performed the action"""
+        if action == Action.SUCK:
+            self.state = self.state.copy()
+            self.state.clean(self.current_position)
+        else:
+            self.current_position = self.current_position.perform_move(action)
+        self.last_action = action
+
     def expand_node(self, node: SearchState, alpha: float) -> list[SearchState]:
         # Check the legal moves on the current position of the agent
         allowed_moves = list(node.position.allowed_moves())
         # Perform an additional check to see if we are allowed to suck
-        if node.get_environment_state().environment[node.position] == StateTypes.DIRTY:
+        if node.get_environment_state().status(node.position) == StateTypes.DIRTY:
             allowed_moves.append(Action.SUCK)
 
         # For the list of legal moves, perform them and put the resulting search state into the output array
@@ -79,14 +249,44 @@ class AStarAgent:
             environment = node.environment.copy()
             if action == Action.SUCK:
                 environment.clean(node.position)
-            path = node.path.copy()
-            path.append(action)
-            new_state = SearchState(environment=environment, position=new_location, path=path, cost=node.cost + 1)
+            new_state = self.search_state(environment=environment, position=new_location, parent=node,
+                                          action=action, cost=node.cost + 1, alpha=alpha)
             out.append(new_state)
 
         return out
 
 
+class VacuumProblem(SearchProblem):
+    def __init__(self, agent: AStarAgent):
+        """
+        The world of an agent as a SearchProblem for hda_star.
+        The states are the ints of EnvironmentState.pack, so only ints are sent between the workers.
+        """
+        self.agent = agent
+        self.size = len(agent.state.locations)
+
+    def unpack(self, state: int) -> SearchState:
+        mask = (1 << self.size) - 1
+        environment = self.agent.state.copy()
+        environment.dirty = state & mask
+        environment.known = state >> self.size & mask
+        environment.dirty_count = environment.dirty.bit_count()
+        return self.agent.search_state(environment, environment.locations[state >> 2 * self.size])
+
+    def initial_state(self) -> int:
+        return self.agent.state.pack(self.agent.current_position)
+
+    def is_goal(self, state: int) -> bool:
+        return self.unpack(state).get_environment_state() == self.agent.goal_state
+
+    def heuristic(self, state: int) -> float:
+        return self.unpack(state).heuristic
+
+    def successors(self, state: int) -> Iterable[tuple]:
+        for child in self.agent.expand_node(self.unpack(state), 1):
+            yield child.key(), child.action, 1, child.heuristic
+
+
 def run(alpha=1.5):
     environment = test_environment.copy()
     agent = AStarAgent(Location.A, environment)
@@ -94,8 +294,46 @@ def run(alpha=1.5):
     print(f"\nPath: {solution[0]} - Cost of path: {solution[1]} - Number of nodes explored: {solution[2]}")
 
 
+def compare_transposition_table(alpha: float = 1) -> None:
+    """Prints the number of explored nodes with and without the transposition table for several start configurations"""
+    environments = {
+        "all dirty": test_environment,
+        "A and D dirty": {**test_environment, Location.B: StateTypes.CLEAN, Location.C: StateTypes.CLEAN},
+        "only B dirty": {**{location: StateTypes.CLEAN for location in test_environment}, Location.B: StateTypes.DIRTY},
+    }
+    for name, environment in environments.items():
+        for position in (Location.A, Location.B, Location.C, Location.D):
+            explored = []
+            for transposition_table in (False, True):
+                agent = AStarAgent(position, environment.copy(), verbose=False)
+                path, cost, explored_node_count = agent.weighted_A_star(alpha, transposition_table)
+                explored.append(explored_node_count)
+            print(f"Start {position!r}, {name}: cost {cost}, explored nodes {explored[0]} without and {explored[1]} "
+                  f"with the transposition table")
+
+
 if __name__ == '__main__':
     for alpha in [1, 1.1]:
     # for alpha in [1, 1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.7, 1.8, 1.9]:
         print(f"Running A-star with alpha: {alpha}")
         run(alpha)
+
+    for alpha in [1, 1.1]:
+        print(f"\nTransposition table with alpha: {alpha}")
+        compare_transposition_table(alpha)
+
+    print("\nHash distributed A-star")
+    for workers in [1, 2, 4]:
+        agent = AStarAgent(Location.A, test_environment.copy(), verbose=False)
+        solution = agent.parallel_A_star(1, workers)
+        print(f"{workers} workers: Path: {solution[0]} - Cost of path: {solution[1]} - "
+              f"Number of nodes explored: {solution[2]}")
+
+    for lookahead in [1, 10]:
+        print(f"\nReal-time search with a lookahead of {lookahead} expansions")
+        learned_heuristic = {}
+        for episode in range(1, 7):
+            agent = AStarAgent(Location.A, test_environment.copy(), verbose=False)
+            solution = agent.real_time_search(lookahead, learned_heuristic)
+            print(f"Episode {episode}: Path: {solution[0]} - Cost of path: {solution[1]} - "
+                  f"Number of nodes explored: {solution[2]}")
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import random
+import time
+from typing import Iterable
+
+import numpy as np
+
+from Enums import StateTypes, Location, Action
+from Lab3.Assignment1.AStarAgent import AStarAgent
+from Lab3.Assignment1.SearchState import EnvironmentState, SearchState
+
+# The moves of the robot, in the order of the columns of GridWorld.neighbours
+grid_moves = (Action.UP, Action.DOWN, Action.LEFT, Action.RIGHT)
+_move_columns = {move: column for column, move in enumerate(grid_moves)}
+_offsets = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+class GridCell:
+    __slots__ = ('world', 'id', 'row', 'column')
+
+    def __init__(self, world: GridWorld, id: int, row: int, column: int):
+        """
+        A free cell of a GridWorld, used as the position of the robot in place of a Location.
+        There is exactly one GridCell per cell, so they are compared and hashed by identity.
+        """
+        self.world = world
+        self.id = id
+        self.row = row
+        self.column = column
+
+    def __repr__(self):
+        return f"({self.row}, {self.column})"
+
+    def allowed_moves(self) -> tuple[Action, ...]:
+        return self.world.allowed[self.id]
+
+    def perform_move(self, move: Action) -> GridCell | Location:
+        """ Returns the resulting cell after performing the move (Location.UNKNOWN if the move is not allowed)"""
+        if move not in _move_columns:
+            return self
+
+        neighbour = self.world.neighbour_lists[self.id][_move_columns[move]]
+        return Location.UNKNOWN if neighbour < 0 else self.world.cells[neighbour]
+
+
+class GridWorld:
+    def __init__(self, rows: int, columns: int, obstacles: Iterable[tuple[int, int]] = ()):
+        """
+        A rows x columns grid for the vacuum robot, the (row, column) cells in obstacles can not be entered.
+
+        The free cells get ids in row-major order, and the moves are precomputed once as arrays:
+        neighbours[i, m] is the id of the cell reached from cell i with grid_moves[m] (-1 if the move is blocked).
+        Maze distances are computed by breadth-first search over the table, and cached per source cell.
+        """
+        free = np.ones((rows, columns), dtype=bool)
+        for row, column in obstacles:
+            free[row, column] = False
+        free_rows, free_columns = np.nonzero(free)
+
+        self.rows = rows
+        self.columns = columns
+        self.ids = np.full((rows, columns), -1, dtype=np.int32)
+        self.ids[free_rows, free_columns] = np.arange(len(free_rows), dtype=np.int32)
+
+        # A border of blocked cells, so moves off the grid need no special case
+        padded = np.full((rows + 2, columns + 2), -1, dtype=np.int32)
+        padded[1:-1, 1:-1] = self.ids
+        self.neighbours = np.stack([padded[free_rows + 1 + d_row, free_columns + 1 + d_column]
+                                    for d_row, d_column in _offsets], axis=1)
+
+        self.cells = [GridCell(self, i, row, column)
+                      for i, (row, column) in enumerate(zip(free_rows.tolist(), free_columns.tolist()))]
+        # Plain lists for the lookups of single moves, which are slower on numpy arrays
+        self.neighbour_lists: list[list[int]] = self.neighbours.tolist()
+        self.allowed: list[tuple[Action, ...]] = [
+            (*(move for move, neighbour in zip(grid_moves, row) if neighbour >= 0), Action.NO_OP)
+            for row in self.neighbour_lists]
+
+        self.distance_tables: dict[int, np.ndarray] = {}
+        self.tree_weights: dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def cell(self, row: int, column: int) -> GridCell:
+        if not (0 <= row < self.rows and 0 <= column < self.columns) or self.ids[row, column] < 0:
+            raise Exception(f"The cell ({row}, {column}) is not a free cell of the grid")
+        return self.cells[self.ids[row, column]]
+
+    def environment(self, dirty: Iterable[GridCell]) -> dict[GridCell: StateTypes]:
+        """Returns an environment with the dirty cells DIRTY and all other cells CLEAN, in the order of the ids"""
+        dirty = set(dirty)
+        return {cell: StateTypes.DIRTY if cell in dirty else StateTypes.CLEAN for cell in self.cells}
+
+    def distances_from(self, source: int) -> np.ndarray:
+        """Returns the number of moves from the cell with id source to every cell (-1 if it can't be reached).
+
+        Level synchronous breadth-first search, a whole level is expanded with array operations"""
+        if source in self.distance_tables:
+            return self.distance_tables[source]
+
+        distances = np.full(len(self.cells), -1, dtype=np.int32)
+        distances[source] = 0
+        fringe = np.array([source], dtype=np.int32)
+        depth = 0
+        while fringe.size > 0:
+            depth += 1
+            children = self.neighbours[fringe].ravel()
+            children = children[children >= 0]
+            children = np.unique(children[distances[children] < 0])
+            distances[children] = depth
+            fringe = children
+
+        self.distance_tables[source] = distances
+        return distances
+
+    def dirty_cells(self, environment: EnvironmentState) -> list[int]:
+        """Returns the ids of the dirty cells of the environment, by walking the set bits of its dirty mask"""
+        out = []
+        mask = environment.dirty
+        while mask:
+            low = mask & -mask
+            out.append(environment.locations[low.bit_length() - 1].id)
+            mask ^= low
+        return out
+
+    def spanning_tree_weight(self, cells: list[int]) -> float:
+        """Weight of the minimum spanning tree over the maze distances between cells (Prim's algorithm).
+        Infinite if some of the cells can't reach each other"""
+        if len(cells) < 2:
+            return 0
+        distances = np.array([self.distances_from(cell)[cells] for cell in cells], dtype=np.float64)
+        distances[distances < 0] = np.inf
+
+        in_tree = np.zeros(len(cells), dtype=bool)
+        in_tree[0] = True
+        best = distances[0].copy()
+        weight = 0
+        for _ in range(len(cells) - 1):
+            best[in_tree] = np.inf
+            nearest = int(np.argmin(best))
+            if best[nearest] == np.inf:
+                return np.inf
+            weight += int(best[nearest])
+            in_tree[nearest] = True
+            best = np.minimum(best, distances[nearest])
+        return weight
+
+    def heuristic(self, environment: EnvironmentState, position: GridCell) -> float:
+        """
+        Admissible estimate of the cost of cleaning the environment from position:
+        one SUCK per dirty cell, the distance to the nearest dirty cell,
+        and the weight of the minimum spanning tree over the dirty cells
+        (any route through all dirty cells is at least as long as a tree connecting them).
+
+        The tree only depends on the dirty cells, so its weight is cached per dirty mask.
+        """
+        dirty = self.dirty_cells(environment)
+        if not dirty:
+            return 0
+
+        distances = [int(self.distances_from(cell)[position.id]) for cell in dirty]
+        if min(distances) < 0:
+            return np.inf
+        if environment.dirty not in self.tree_weights:
+            self.tree_weights[environment.dirty] = self.spanning_tree_weight(dirty)
+        return len(dirty) + min(distances) + self.tree_weights[environment.dirty]
+
+
+class GridSearchState(SearchState):
+    __slots__ = ()
+    heuristic_scale = 1
+
+    def get_heuristic(self):
+        return self.position.world.heuristic(self.environment, self.position)
+
+
+class GridAgent(AStarAgent):
+    search_state = GridSearchState
+
+    def __init__(self, start_position: GridCell, start_state_space: dict[GridCell: StateTypes],
+                 verbose: bool = False):
+        """AStarAgent for a GridWorld, the goal is to clean every cell of the environment"""
+        super().__init__(start_position, start_state_space, verbose=verbose)
+        # Cleaned from a copy, so the goal shares the locations of the start state and compares in O(1)
+        self.goal_state = self.state.copy()
+        for location in self.goal_state.locations:
+            self.goal_state.clean(location)
+
+
+def random_grid(size: int, obstacle_ratio: float, dirt_count: int, seed: int = 0) \
+        -> tuple[GridWorld, GridCell, dict[GridCell: StateTypes]]:
+    """Returns a size x size grid with random obstacles, the start cell of the robot,
+    and an environment with dirt on random cells the robot can reach"""
+    rng = random.Random(seed)
+    obstacles = [(row, column) for row in range(size) for column in range(size)
+                 if (row, column) != (0, 0) and rng.random() < obstacle_ratio]
+    world = GridWorld(size, size, obstacles)
+    start = world.cell(0, 0)
+    reachable = np.nonzero(world.distances_from(start.id) > 0)[0].tolist()
+    dirty = [world.cells[i] for i in rng.sample(reachable, min(dirt_count, len(reachable)))]
+    return world, start, world.environment(dirty)
+
+
+if __name__ == '__main__':
+    print("2x2 grid (the same world as the Location enum)")
+    world = GridWorld(2, 2)
+    agent = GridAgent(world.cell(0, 0), world.environment(world.cells))
+    path, cost, explored = agent.weighted_A_star(1)
+    print(f"Path: {path} - Cost of path: {cost} - Number of nodes explored: {explored}")
+
+    for size in [10, 25, 50, 100, 200]:
+        start_time = time.perf_counter_ns()
+        world, start, environment = random_grid(size, obstacle_ratio=0.2, dirt_count=5)
+        end_time = time.perf_counter_ns()
+        build_time = (end_time - start_time) / 10 ** 6
+
+        for alpha in [1, 1.5]:
+            # Without the transposition table A* expands every equally short route between the dirty cells,
+            # so that only runs on the small grids
+            for transposition_table in [False, True] if size <= 25 else [True]:
+                start_time = time.perf_counter_ns()
+                agent = GridAgent(start, environment)
+                path, cost, explored = agent.weighted_A_star(alpha, transposition_table)
+                end_time = time.perf_counter_ns()
+                print(f"{size}x{size} grid ({len(world)} free cells, built in {build_time} ms), alpha {alpha}, "
+                      f"transposition table {transposition_table}: "
+                      f"cost {cost}, {explored} nodes explored in {(end_time - start_time) / 10 ** 6} ms")
+
+    print("Real-time search: the latency of the first action, and of the slowest step")
+    for size in [50, 100, 200]:
+        world, start, environment = random_grid(size, obstacle_ratio=0.2, dirt_count=5)
+        start_time = time.perf_counter_ns()
+        GridAgent(start, environment).weighted_A_star(1)
+        end_time = time.perf_counter_ns()
+        planning_time = (end_time - start_time) / 10 ** 6
+
+        agent = GridAgent(start, environment)
+        step_times = []
+        path = []
+        while agent.state != agent.goal_state:
+            start_time = time.perf_counter_ns()
+            action, _ = agent.real_time_step(lookahead=50)
+            end_time = time.perf_counter_ns()
+            step_times.append((end_time - start_time) / 10 ** 6)
+            path.append(action)
+        print(f"{size}x{size} grid: A-star plans for {planning_time} ms, real-time search takes at most "
+              f"{max(step_times)} ms per step (path cost {len(path)})")
+
+    print("Hash distributed A-star")
+    world, start, environment = random_grid(40, obstacle_ratio=0.2, dirt_count=6)
+    for workers in [1, 2, 4, 8]:
+        start_time = time.perf_counter_ns()
+        path, cost, explored = GridAgent(start, environment).parallel_A_star(1, workers)
+        end_time = time.perf_counter_ns()
+        print(f"40x40 grid with {workers} workers: cost {cost}, {explored} nodes explored "
+              f"in {(end_time - start_time) / 10 ** 6} ms")
+
+    print("Precomputing the tables and evaluating the heuristic on large grids")
+    for size in [100, 300, 1000]:
+        start_time = time.perf_counter_ns()
+        world, start, environment = random_grid(size, obstacle_ratio=0.2, dirt_count=20)
+        end_time = time.perf_counter_ns()
+        build_time = (end_time - start_time) / 10 ** 6
+
+        start_time = time.perf_counter_ns()
+        state = GridSearchState(EnvironmentState(environment), start)
+        end_time = time.perf_counter_ns()
+        print(f"{size}x{size} grid ({len(world)} free cells): built in {build_time} ms, "
+              f"first heuristic {state.heuristic} in {(end_time - start_time) / 10 ** 6} ms")
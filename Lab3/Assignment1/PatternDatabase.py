@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import math
+import os
+import tempfile
+import time
+
+from Enums import Location
+from Lab3.Assignment1.AStarAgent import AStarAgent, test_environment
+from Lab3.Assignment1.GridWorld import GridAgent, GridSearchState, random_grid
+from Lab3.Assignment1.PolicyTable import PolicyTable
+from Lab3.Assignment1.SearchState import EnvironmentState, SearchState
+
+
+class PatternDatabases:
+    def __init__(self, locations: tuple, goal_state: EnvironmentState, patterns: list[tuple], directory: str = None):
+        """
+        Disjoint pattern databases for the vacuum world over locations: one PolicyTable per pattern,
+        holding the exact cost of cleaning only the pattern locations from every position.
+
+        If directory is given, database i is kept there as pattern_i.npy: built and saved the first time,
+        and memory mapped after that (so use one directory per world).
+        """
+        seen = set()
+        for pattern in patterns:
+            if seen.intersection(pattern):
+                raise Exception("The patterns of additive pattern databases must be disjoint")
+            seen.update(pattern)
+
+        self.tables = [PolicyTable(locations, goal_state, pattern=pattern,
+                                   path=None if directory is None else os.path.join(directory, f"pattern_{i}.npy"))
+                       for i, pattern in enumerate(patterns)]
+
+    def heuristic(self, environment: EnvironmentState, position: Location) -> float:
+        """
+        The cost in a database is one SUCK per dirty location of its pattern, plus the moves to reach them.
+        The patterns are disjoint, so their sucks add up (with the dirty locations outside of every pattern),
+        but every database counts the same moves, so only the largest number of moves is used.
+        Infinite if some database can't reach its goal.
+        """
+        moves = 0
+        for table in self.tables:
+            index = table.state_index(environment, position)
+            cost = int(table.table[index]['cost'])
+            if cost < 0:
+                return math.inf
+            pattern_dirt = index & (1 << len(table.pattern)) - 1
+            moves = max(moves, cost - pattern_dirt.bit_count())
+        return environment.count_dirty_states() + moves
+
+
+class PatternSearchState(SearchState):
+    __slots__ = ()
+    # Set on the classes made by pattern_search_state
+    databases: PatternDatabases = None
+
+    def get_heuristic(self):
+        return self.databases.heuristic(self.environment, self.position)
+
+
+def pattern_search_state(databases: PatternDatabases) -> type:
+    """Returns a search state class that uses the databases as its heuristic, to be set as an agent's search_state"""
+    return type('PatternSearchState', (PatternSearchState,), {'__slots__': (), 'databases': databases})
+
+
+def split_pattern(locations: tuple, parts: int) -> list[tuple]:
+    """Splits the locations into parts consecutive disjoint patterns (rows of cells, for a GridWorld)"""
+    size = -(-len(locations) // parts)
+    return [locations[i:i + size] for i in range(0, len(locations), size)]
+
+
+if __name__ == '__main__':
+    print("Vacuum world with four locations")
+    agent = AStarAgent(Location.A, test_environment.copy(), verbose=False)
+    databases = PatternDatabases(agent.state.locations, agent.goal_state, [(Location.A, Location.B),
+                                                                           (Location.C, Location.D)])
+    for name, search_state in [("Dirt count", SearchState), ("Pattern databases", pattern_search_state(databases))]:
+        agent = AStarAgent(Location.A, test_environment.copy(), verbose=False)
+        agent.search_state = search_state
+        path, cost, explored = agent.weighted_A_star(1)
+        print(f"{name}: Path: {path} - Cost of path: {cost} - Number of nodes explored: {explored}")
+
+    size = 5
+    world, start, environment = random_grid(size, obstacle_ratio=0.2, dirt_count=12)
+    agent = GridAgent(start, environment)
+    print(f"\n{size}x{size} grid ({len(world)} free cells, 12 dirty)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for parts in [2, 3]:
+            pattern_directory = os.path.join(directory, f"{parts}_patterns")
+            os.makedirs(pattern_directory)
+            patterns = split_pattern(agent.state.locations, parts)
+            for step in ["Built", "Loaded"]:
+                start_time = time.perf_counter_ns()
+                databases = PatternDatabases(agent.state.locations, agent.goal_state, patterns, pattern_directory)
+                end_time = time.perf_counter_ns()
+                print(f"{step} {parts} pattern databases ({sum(table.size for table in databases.tables)} entries) "
+                      f"in {(end_time - start_time) / 10 ** 6} ms")
+
+            heuristics = [("Dirt count", SearchState), ("Distance and spanning tree", GridSearchState),
+                          (f"{parts} pattern databases", pattern_search_state(databases))]
+            for name, search_state in heuristics:
+                agent = GridAgent(start, environment)
+                agent.search_state = search_state
+                start_time = time.perf_counter_ns()
+                path, cost, explored = agent.weighted_A_star(1)
+                end_time = time.perf_counter_ns()
+                print(f"{name}: cost {cost}, {explored} nodes explored in {(end_time - start_time) / 10 ** 6} ms")
+            del databases
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from Enums import Location, Action
+from Lab3.Assignment1.AStarAgent import AStarAgent, test_environment
+from Lab3.Assignment1.GridWorld import GridAgent, random_grid
+from Lab3.Assignment1.SearchState import EnvironmentState
+
+# The actions stored in the table, an entry holds the index of its action in this tuple (-1 for none)
+policy_actions = (Action.SUCK, Action.UP, Action.DOWN, Action.LEFT, Action.RIGHT)
+# Every state is one record, the cost to go is -1 if the goal can't be reached from the state
+policy_type = np.dtype([('cost', '<i2'), ('action', 'i1')])
+
+
+class PolicyTable:
+    def __init__(self, locations: tuple, goal_state: EnvironmentState, path: str = None, max_states: int = 1 << 28,
+                 pattern: tuple = None):
+        """
+        The exact cost to go and the best action for every state of the vacuum world over locations,
+        where a state is the position of the robot and which locations are dirty (all locations must be known).
+
+        If pattern is given, the table is for the abstraction of the world that only tracks the dirt on the pattern
+        locations (the robot can still be anywhere), so its costs are lower bounds for the whole world.
+        The state with the robot on locations[p] and dirt mask d (bit i for pattern[i]) is record p << len(pattern) | d.
+        The table is solved by a breadth-first search backwards from all states that match goal_state.
+        If path is given, the table is loaded from that .npy file through a memory map, or built and saved there first.
+        """
+        self.locations = locations
+        self.index: dict = {location: i for i, location in enumerate(locations)}
+        self.pattern: tuple = locations if pattern is None else tuple(pattern)
+        if any(location not in self.index for location in self.pattern):
+            raise Exception("The pattern has locations that are not in the world")
+        # Bit of every pattern location in the environment masks, and the pattern bit sucked on every location
+        self.pattern_bits = [1 << self.index[location] for location in self.pattern]
+        self.pattern_mask = sum(self.pattern_bits)
+        pattern_index = {location: i for i, location in enumerate(self.pattern)}
+        self.suck_bits = np.array([1 << pattern_index[location] if location in pattern_index else 0
+                                   for location in locations], dtype=np.int64)
+
+        self.size = len(locations) << len(self.pattern)
+        if self.size > max_states:
+            raise Exception(f"A table over {len(self.pattern)} locations has too many states ({self.size})")
+
+        if goal_state.locations != locations:
+            goal_state = EnvironmentState({location: goal_state.status(location) for location in locations})
+        self.goal_state = goal_state
+
+        if path is not None and os.path.exists(path):
+            self.table = np.load(path, mmap_mode='r')
+            if self.table.dtype != policy_type or self.table.shape != (self.size,):
+                raise Exception(f"The table in {path} does not belong to this vacuum world")
+            return
+
+        cost, action = self.retrograde_search()
+        if path is None:
+            self.table = np.empty(self.size, dtype=policy_type)
+        else:
+            self.table = np.lib.format.open_memmap(path, mode='w+', dtype=policy_type, shape=(self.size,))
+        self.table['cost'] = cost
+        self.table['action'] = action
+        if path is not None:
+            self.table.flush()
+            self.table = np.load(path, mmap_mode='r')
+
+    def project(self, mask: int) -> int:
+        """The bits of an environment mask on the pattern locations, as a mask over the pattern"""
+        if self.pattern is self.locations:
+            return mask
+        return sum(1 << i for i, bit in enumerate(self.pattern_bits) if mask & bit)
+
+    def move_tables(self) -> np.ndarray:
+        """reverse[a, p] is the position the robot moves to p from with policy_actions[a] (-1 if there is none)"""
+        reverse = np.full((len(policy_actions), len(self.locations)), -1, dtype=np.int64)
+        for q, location in enumerate(self.locations):
+            for a, move in enumerate(policy_actions):
+                if move == Action.SUCK or move not in location.allowed_moves():
+                    continue
+                target = location.perform_move(move)
+                if target not in self.index:
+                    continue
+                p = self.index[target]
+                if reverse[a, p] >= 0:
+                    raise Exception(f"Two locations reach {target} with {move}")
+                reverse[a, p] = q
+        return reverse
+
+    def retrograde_search(self) -> tuple[np.ndarray, np.ndarray]:
+        """Level synchronous breadth-first search from the goal states along reversed actions.
+
+        A state first reached in level k has cost to go k, and its action is the one that was reversed to reach it,
+        which leads to a state of level k - 1"""
+        n = len(self.pattern)
+        mask = (1 << n) - 1
+        reverse = self.move_tables()
+        cost = np.full(self.size, -1, dtype=np.int16)
+        action = np.full(self.size, -1, dtype=np.int8)
+
+        masks = np.arange(1 << n, dtype=np.int64)
+        goal_dirty = self.project(self.goal_state.dirty)
+        goal_known = self.project(self.goal_state.known)
+        goal_masks = masks[((masks ^ goal_dirty) & goal_known) == 0]
+        fringe = (np.arange(len(self.locations), dtype=np.int64)[:, None] << n | goal_masks).ravel()
+        cost[fringe] = 0
+
+        depth = 0
+        while fringe.size > 0:
+            depth += 1
+            positions = fringe >> n
+            dirty = fringe & mask
+            levels = []
+            for a, move in enumerate(policy_actions):
+                if move == Action.SUCK:
+                    # Sucking only changes the dirt under the robot, from dirty to clean (on pattern locations)
+                    bits = self.suck_bits[positions]
+                    clean_here = (bits != 0) & ((dirty & bits) == 0)
+                    predecessors = fringe[clean_here] | bits[clean_here]
+                else:
+                    sources = reverse[a, positions]
+                    moved = sources >= 0
+                    predecessors = sources[moved] << n | dirty[moved]
+                predecessors = np.unique(predecessors[cost[predecessors] < 0])
+                cost[predecessors] = depth
+                action[predecessors] = a
+                levels.append(predecessors)
+            fringe = np.concatenate(levels)
+
+        return cost, action
+
+    def state_index(self, environment: EnvironmentState, position: Location) -> int:
+        if environment.locations is not self.locations and environment.locations != self.locations:
+            raise Exception("The environment does not have the locations of the table")
+        if (environment.known & self.pattern_mask) != self.pattern_mask:
+            raise Exception("The table only holds environments without UNKNOWN locations")
+        return self.index[position] << len(self.pattern) | self.project(environment.dirty)
+
+    def cost_to_go(self, environment: EnvironmentState, position: Location) -> int:
+        return int(self.table[self.state_index(environment, position)]['cost'])
+
+    def best_action(self, environment: EnvironmentState, position: Location) -> Action:
+        """The first action of a cheapest path to the goal (NO_OP in a goal state, or if the goal can't be reached)"""
+        action = int(self.table[self.state_index(environment, position)]['action'])
+        return Action.NO_OP if action < 0 else policy_actions[action]
+
+
+def follow_policy(agent: AStarAgent, policy: PolicyTable, max_steps: int = 10 ** 6) -> list[Action]:
+    """Lets the agent act on the policy until it reaches its goal, and returns the actions it took"""
+    path = []
+    while agent.state != agent.goal_state and len(path) < max_steps:
+        action = agent.policy_action(policy)
+        if action == Action.NO_OP:
+            break
+        path.append(action)
+    return path
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        print("Vacuum world with four locations")
+        agent = AStarAgent(Location.A, test_environment.copy(), verbose=False)
+        table_path = os.path.join(directory, "vacuum_2x2.npy")
+        policy = PolicyTable(agent.state.locations, agent.goal_state, table_path)
+        print(f"Cost to go from A: {policy.cost_to_go(agent.state, agent.current_position)}")
+        path = follow_policy(agent, policy)
+        print(f"Path: {path} - Cost of path: {len(path)}")
+
+        size = 4
+        world, start, environment = random_grid(size, obstacle_ratio=0.2, dirt_count=size * size)
+        agent = GridAgent(start, environment)
+        table_path = os.path.join(directory, f"vacuum_{size}x{size}.npy")
+
+        start_time = time.perf_counter_ns()
+        policy = PolicyTable(agent.state.locations, agent.goal_state, table_path)
+        end_time = time.perf_counter_ns()
+        print(f"\n{size}x{size} grid ({len(world)} free cells): {policy.size} states solved and saved "
+              f"in {(end_time - start_time) / 10 ** 6} ms")
+
+        start_time = time.perf_counter_ns()
+        policy = PolicyTable(agent.state.locations, agent.goal_state, table_path)
+        end_time = time.perf_counter_ns()
+        print(f"Loading the table took {(end_time - start_time) / 10 ** 6} ms")
+
+        start_time = time.perf_counter_ns()
+        path = follow_policy(agent, policy)
+        end_time = time.perf_counter_ns()
+        print(f"Policy: cost {len(path)}, {(end_time - start_time) / 10 ** 3 / len(path)} us per step")
+
+        start_time = time.perf_counter_ns()
+        _, cost, explored = GridAgent(start, environment).weighted_A_star(1)
+        end_time = time.perf_counter_ns()
+        print(f"A-star: cost {cost}, {explored} nodes explored in {(end_time - start_time) / 10 ** 6} ms")
+        del policy
@@ -1,68 +1,131 @@
 from __future__ import annotations
 
-from copy import deepcopy
-
 from Enums import StateTypes, Location, Action
 
 
 class EnvironmentState:
     def __init__(self, environment: dict[Location: StateTypes]):
-        self.environment = environment
+        """
+        The environment is packed into two bitmasks over its locations (bit i is the i'th location of the dict):
+        dirty has the bits of the DIRTY locations set, and known has the bits of the locations that are not UNKNOWN.
+        Copies share the tuple of locations, so copying, comparing and cleaning are O(1).
+        The number of dirty locations is kept up to date by clean, so it is never recounted.
+        """
+        self.locations: tuple = tuple(environment.keys())
+        self.index: dict = {location: i for i, location in enumerate(self.locations)}
+        self.dirty = 0
+        self.known = 0
+        for location, value in environment.items():
+            bit = 1 << self.index[location]
+            if value == StateTypes.DIRTY:
+                self.dirty |= bit
+            if value != StateTypes.UNKNOWN:
+                self.known |= bit
+        self.dirty_count = self.dirty.bit_count()
+
+    @property
+    def environment(self) -> dict[Location: StateTypes]:
+        """The environment as a dict of location to state type (rebuilt on every access)"""
+        return {location: self.status(location) for location in self.locations}
+
+    def status(self, location: Location) -> StateTypes:
+        bit = 1 << self.index[location]
+        if not self.known & bit:
+            return StateTypes.UNKNOWN
+        return StateTypes.DIRTY if self.dirty & bit else StateTypes.CLEAN
 
     def count_dirty_states(self) -> int:
-        out = 0
-        for k, v in self.environment.items():
-            if v == StateTypes.DIRTY:
-                out += 1
-        return out
-
-    def __eq__(self, other):
-        if type(other) != EnvironmentState or len(other.environment) != len(self.environment):
-            return False
+        return self.dirty_count
 
-        for k, v in self.environment.items():
-            other_val = other.environment[k]
+    def key(self) -> int:
+        """
+        The known and dirty masks packed into a single int, computed in O(1), to be used as a hash key.
+        Two states have the same key only if they are equal location for location (UNKNOWN only matches UNKNOWN).
+        Environments are not hashable themselves, as no hash could agree with the UNKNOWN wildcard of __eq__.
+        """
+        return self.known << len(self.locations) | self.dirty
 
-            if other_val == StateTypes.UNKNOWN or v == StateTypes.UNKNOWN:
-                continue
+    def pack(self, position: Location) -> int:
+        """Packs the environment and the position of the robot into a single int, to be used as a hash key"""
+        size = len(self.locations)
+        return self.index.get(position, size) << 2 * size | self.key()
 
-            if other_val != v:
+    def __eq__(self, other):
+        if type(other) != EnvironmentState or len(other.locations) != len(self.locations):
+            return False
+        if other.locations is not self.locations and other.locations != self.locations:
+            if set(other.locations) != set(self.locations):
                 return False
+            # Renumber the bits of other to the location order of this state
+            other = EnvironmentState({location: other.status(location) for location in self.locations})
 
-        return True  # The other thing is an EnvironmentState,
-        # it has the same number of elements as this, and all values match, They must be equal
+        # Locations that are UNKNOWN in either state match anything, all other locations must be equal
+        return (self.dirty ^ other.dirty) & self.known & other.known == 0
 
     def copy(self) -> EnvironmentState:
-        """Returns a deepcopy of this state, that can then be modified at will"""
-        out_state = deepcopy(self.environment)
-        return EnvironmentState(out_state)
+        """Returns a copy of this state, that can then be modified at will"""
+        out_state = EnvironmentState.__new__(EnvironmentState)
+        out_state.locations = self.locations
+        out_state.index = self.index
+        out_state.dirty = self.dirty
+        out_state.known = self.known
+        out_state.dirty_count = self.dirty_count
+        return out_state
 
     def clean(self, location: Location) -> None:
-        if location not in self.environment:
+        if location not in self.index:
             raise Exception(f"This location ({location}) does not exist")
-        self.environment[location] = StateTypes.CLEAN
+        bit = 1 << self.index[location]
+        if self.dirty & bit:
+            self.dirty_count -= 1
+        self.dirty &= ~bit
+        self.known |= bit
 
     def __repr__(self):
         return str(self.environment)
 
 
 class SearchState:
-    def __init__(self, environment: EnvironmentState, position: Location, path: list[Action] = None, cost: int = 0):
+    __slots__ = ('environment', 'position', 'parent', 'action', 'cost', 'heuristic', 'alpha', 'f')
+    # Every heuristic value times heuristic_scale is an integer (get_heuristic adds 0.5 on a clean location)
+    heuristic_scale = 2
+
+    def __init__(self, environment: EnvironmentState, position: Location, parent: SearchState = None,
+                 action: Action = None, cost: int = 0, alpha: float = 1):
         """
         The environment should contain the state of the environment after the last action in the path have been performed.
         Position should contain the position of the vacuum robot.
+        parent is the search state that action was performed in to get to this state (None for the initial state).
         cost is a running (true) cost of all actions taken on the path.
+
+        The heuristic and the weighted sum for alpha are computed once here,
+        so the environment must not be changed after the search state is created.
         """
         self.environment = environment
         self.position = position
-        self.path = path if path is not None else []
+        self.parent = parent
+        self.action = action
         self.cost = cost
+        self.heuristic = self.get_heuristic()
+        self.alpha = alpha
+        self.f = cost + self.heuristic * alpha
+
+    @property
+    def path(self) -> list[Action]:
+        """The actions from the initial state to this state, rebuilt by following the parents"""
+        path = []
+        state = self
+        while state.parent is not None:
+            path.append(state.action)
+            state = state.parent
+        path.reverse()
+        return path
 
     def get_heuristic_a(self):
         return self.environment.count_dirty_states()
 
     def get_heuristic(self):
-        extra = 0.5 if self.environment.environment[self.position] == StateTypes.CLEAN else 0
+        extra = 0.5 if self.environment.status(self.position) == StateTypes.CLEAN else 0
         return self.environment.count_dirty_states() + extra
 
     def insert(self, queue: list[SearchState], alpha: float = 1) -> list[SearchState]:
@@ -85,10 +148,16 @@ class SearchState:
         return self.weighted_sum(alpha) - other.weighted_sum(alpha)
 
     def weighted_sum(self, alpha: float) -> float:
-        return self.cost + self.get_heuristic() * alpha
+        if alpha == self.alpha:
+            return self.f
+        return self.cost + self.heuristic * alpha
 
     def get_environment_state(self):
         return self.environment
 
+    def key(self) -> int:
+        """The environment and position packed into one int, equal for search states that only differ in their path"""
+        return self.environment.pack(self.position)
+
     def __repr__(self):
         return f"SearchState ( env: {self.environment} - pos{self.position} - path:{self.path} - cost: {self.cost})"
\ No newline at end of file
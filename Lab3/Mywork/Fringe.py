@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import heapq
+from collections import deque
+from itertools import count
+from typing import Callable, Iterable
+
+
+def weighted_sum(item, alpha: float) -> float:
+    return item.weighted_sum(alpha)
+
+
+class PriorityFringe:
+    def __init__(self, alpha: float = 1, priority: Callable[[object, float], float] = weighted_sum):
+        """
+        The fringe of a search ordered by priority(item, alpha) (the weighted sum of a node or search state),
+        backed by a binary heap (heapq), so insertions and removals are O(log n).
+        Items with the same priority are removed in the order they were inserted.
+        """
+        self.alpha = alpha
+        self.priority = priority
+        self.heap: list[tuple[float, int, object]] = []
+        self.insertion_order = count()
+
+    def insert(self, item) -> None:
+        heapq.heappush(self.heap, (self.priority(item, self.alpha), next(self.insertion_order), item))
+
+    def insert_all(self, items: Iterable) -> None:
+        for item in items:
+            self.insert(item)
+
+    def remove_first(self):
+        return heapq.heappop(self.heap)[2]
+
+    def first(self):
+        """Returns the item that remove_first would remove, without removing it"""
+        return self.heap[0][2]
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def __iter__(self):
+        """Iterates over the items in the order they would be removed (sorts the heap, only meant for printing)"""
+        return (item for _, _, item in sorted(self.heap))
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class BucketFringe(PriorityFringe):
+    # The buckets may span at most min_buckets + buckets_per_item * (items in the fringe) priorities
+    min_buckets = 64
+    buckets_per_item = 4
+
+    def __init__(self, alpha: float = 1, priority: Callable[[object, float], float] = weighted_sum, scale: int = 1):
+        """
+        A PriorityFringe that is a bucket queue (Dial's algorithm) as long as every priority times scale is an integer
+        (scale 2 for heuristics that can end in .5): bucket k holds the items with priority (base + k) / scale
+        in the order they were inserted, where base is the key of the first item, and a cursor points at the
+        lowest bucket that can be non-empty, so insertions and removals are O(1) (plus the buckets skipped over).
+
+        The items move into the heap, which is used from then on, as soon as a key is not an integer, is below base,
+        or would make the buckets span more than the limit above (large alphas spread the keys out too far for
+        buckets to pay off). The items come out in the same order either way.
+        """
+        super().__init__(alpha, priority)
+        self.scale = scale
+        self.buckets: list[deque] | None = []
+        self.base = 0
+        self.cursor = 0
+        self.size = 0
+
+    def insert(self, item) -> None:
+        if self.buckets is None:
+            return super().insert(item)
+
+        priority = self.priority(item, self.alpha)
+        key = priority * self.scale
+        if not float(key).is_integer():
+            self.use_heap()
+            return super().insert(item)
+
+        if not self.buckets:
+            self.base = int(key)
+        index = int(key) - self.base
+        if index < 0 or index >= self.min_buckets + self.buckets_per_item * (self.size + 1):
+            self.use_heap()
+            return super().insert(item)
+        while len(self.buckets) <= index:
+            self.buckets.append(deque())
+        self.buckets[index].append((priority, next(self.insertion_order), item))
+        self.cursor = min(self.cursor, index)
+        self.size += 1
+
+    def use_heap(self) -> None:
+        """Moves the items of the buckets into the heap, keeping their insertion order for ties"""
+        for bucket in self.buckets:
+            self.heap.extend(bucket)
+        heapq.heapify(self.heap)
+        self.buckets = None
+
+    def advance_cursor(self) -> None:
+        while not self.buckets[self.cursor]:
+            self.cursor += 1
+
+    def remove_first(self):
+        if self.buckets is None:
+            return super().remove_first()
+        self.advance_cursor()
+        self.size -= 1
+        return self.buckets[self.cursor].popleft()[2]
+
+    def first(self):
+        if self.buckets is None:
+            return super().first()
+        self.advance_cursor()
+        return self.buckets[self.cursor][0][2]
+
+    def __len__(self) -> int:
+        return len(self.heap) if self.buckets is None else self.size
+
+    def __iter__(self):
+        if self.buckets is None:
+            return super().__iter__()
+        return (item for bucket in self.buckets[self.cursor:] for _, _, item in bucket)
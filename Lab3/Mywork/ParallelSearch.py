@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import heapq
+import math
+import multiprocessing
+import pickle
+import queue
+import zlib
+from itertools import count
+from typing import Iterable
+
+
+class SearchProblem:
+    """
+    What hda_star needs to know about a problem. States are sent between processes,
+    so they should be small picklable values (a name, a tuple or a packed int).
+    """
+
+    def initial_state(self):
+        raise Exception("No initial state set")
+
+    def is_goal(self, state) -> bool:
+        raise Exception("No goal set")
+
+    def heuristic(self, state) -> float:
+        raise Exception("No heuristics set")
+
+    def successors(self, state) -> Iterable[tuple]:
+        """Yields a (child state, action, cost to child, heuristic of the child) tuple for every child"""
+        raise Exception("No state space set")
+
+    def owner(self, state, workers: int) -> int:
+        """The worker that owns the state. Must give the same answer in every process,
+        so str and tuple states are hashed with crc32 (hash() of a str is salted per process)"""
+        key = hash(state) if isinstance(state, int) else zlib.crc32(repr(state).encode())
+        return (key * 2654435761 & 0xFFFFFFFF) * workers >> 32
+
+
+def hda_star(problem: SearchProblem, workers: int = 4, weight_alpha: float = 1, batch_size: int = 16) \
+        -> tuple[list[tuple], float, int]:
+    """
+    Hash distributed A-star: every worker process owns the states that SearchProblem.owner maps to it,
+    and runs A-star with its own open list and table of best costs on them.
+    Children owned by another worker are sent to its queue (in batches, after at most batch_size expansions).
+
+    The cost of the best goal found is shared, and nodes with a weighted sum at least that high are not expanded.
+    The search ends when no message is in flight and every open list is empty or only holds such nodes,
+    so with weight_alpha 1 and an admissible heuristic the goal is optimal.
+    If a worker raises (also for a state that can't be pickled, as the workers pickle what they send themselves),
+    all workers are stopped and hda_star raises the same exception.
+
+    Returns a tuple containing:
+    (list of (state, action, cost) from the initial state to the goal, cost of the path, number of expanded nodes)
+    The path is [] and the cost -1 if there is no goal.
+    """
+    context = multiprocessing.get_context()
+    inboxes = [context.Queue() for _ in range(workers)]
+    results = context.Queue()
+    upper = context.Value('d', math.inf)
+    lowest = context.Array('d', [math.inf] * workers)
+    # Batches put in a queue but not yet taken out of it, and the number of batches ever sent
+    pending = context.Value('q', 0)
+    sent = context.Value('q', 0)
+    stop = context.Event()
+
+    processes = [context.Process(target=hda_star_worker,
+                                 args=(problem, index, workers, weight_alpha, batch_size, inboxes, results, upper,
+                                       lowest, pending, sent, stop), daemon=True)
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+
+    initial_state = problem.initial_state()
+    with pending.get_lock():
+        pending.value += 1
+        sent.value += 1
+    inboxes[problem.owner(initial_state, workers)].put(pickle.dumps([(initial_state, 0, problem.heuristic(initial_state),
+                                                                       None, None)]))
+
+    # Workers only exit after stop is set, so a worker that sets it or exits before that has failed
+    while not stop.wait(0.001) and all(process.exitcode is None for process in processes):
+        # Nothing may have been sent while the lowest weighted sums were read, or a node could have been missed
+        sent_before, pending_before = sent.value, pending.value
+        lowest_sum = min(lowest[:])
+        if pending.value == pending_before == 0 and sent.value == sent_before and lowest_sum >= upper.value:
+            break
+    stop.set()
+
+    outcomes = []
+    while len(outcomes) < workers:
+        try:
+            outcomes.append(results.get(timeout=0.1))
+        except queue.Empty:
+            if all(process.exitcode is not None for process in processes):
+                break
+    for process in processes:
+        process.join()
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+    if len(outcomes) < workers:
+        raise Exception("An hda_star worker process exited without a result")
+
+    tables = {}
+    expanded = 0
+    goal = None
+    for table, worker_expanded, worker_goal in map(pickle.loads, outcomes):
+        tables.update(table)
+        expanded += worker_expanded
+        if worker_goal is not None and (goal is None or worker_goal[1] < goal[1]):
+            goal = worker_goal
+
+    if goal is None:
+        return [], -1, expanded
+
+    path = []
+    state = goal[0]
+    while state is not None:
+        cost, parent, action = tables[state]
+        path.append((state, action, cost))
+        state = parent
+    path.reverse()
+    return path, goal[1], expanded
+
+
+def hda_star_worker(problem: SearchProblem, index: int, workers: int, alpha: float, batch_size: int,
+                    inboxes: list, results, upper, lowest, pending, sent, stop) -> None:
+    """Runs hda_star_search, and if it raises, puts the exception in results instead and stops the search,
+    so that hda_star raises it rather than waiting for the worker forever"""
+    try:
+        hda_star_search(problem, index, workers, alpha, batch_size, inboxes, results, upper, lowest, pending, sent,
+                        stop)
+    except BaseException as error:
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = Exception(f"hda_star worker {index} failed: {error!r}")
+        for inbox in inboxes:
+            inbox.cancel_join_thread()
+        results.put(error)
+        stop.set()
+
+
+def hda_star_search(problem: SearchProblem, index: int, workers: int, alpha: float, batch_size: int,
+                    inboxes: list, results, upper, lowest, pending, sent, stop) -> None:
+    """The loop of one hda_star worker: take in the batches sent to it, expand up to batch_size nodes,
+    send the children it does not own, and publish the lowest weighted sum of its open list.
+
+    The lowest weighted sum is only raised after the children are sent and before received batches are counted
+    as taken, so every node is always in an open list that is accounted for, or in a pending batch"""
+    inbox = inboxes[index]
+    open_list = []
+    insertion_order = count()
+    # state: (cost, parent state, action) of the cheapest path found to the state
+    best = {}
+    outboxes = [[] for _ in range(workers)]
+    expanded = 0
+    goal = None
+
+    def consider(state, cost: float, heuristic: float, parent, action) -> None:
+        if cost < best.get(state, (math.inf,))[0]:
+            best[state] = (cost, parent, action)
+            heapq.heappush(open_list, (cost + heuristic * alpha, next(insertion_order), cost, state))
+
+    def publish() -> None:
+        lowest[index] = open_list[0][0] if open_list else math.inf
+
+    while not stop.is_set():
+        received = 0
+        block = not open_list or open_list[0][0] >= upper.value
+        try:
+            while True:
+                batch = inbox.get(timeout=0.01) if block else inbox.get_nowait()
+                for message in pickle.loads(batch):
+                    consider(*message)
+                received += 1
+                block = False
+        except queue.Empty:
+            pass
+        if received:
+            publish()
+            with pending.get_lock():
+                pending.value -= received
+
+        for _ in range(batch_size):
+            if not open_list or open_list[0][0] >= upper.value:
+                break
+            _, _, cost, state = heapq.heappop(open_list)
+            if cost > best[state][0]:
+                continue
+            if problem.is_goal(state):
+                with upper.get_lock():
+                    if cost < upper.value:
+                        upper.value = cost
+                        goal = (state, cost)
+                continue
+            expanded += 1
+            for child, action, step_cost, heuristic in problem.successors(state):
+                owner = problem.owner(child, workers)
+                if owner == index:
+                    consider(child, cost + step_cost, heuristic, state, action)
+                else:
+                    outboxes[owner].append((child, cost + step_cost, heuristic, state, action))
+
+        for owner, outbox in enumerate(outboxes):
+            if outbox:
+                with pending.get_lock():
+                    pending.value += 1
+                    sent.value += 1
+                inboxes[owner].put(pickle.dumps(outbox))
+                outboxes[owner] = []
+        publish()
+
+    # Batches left in the queues are not needed anymore, so exiting must not wait for them to be flushed
+    for other_inbox in inboxes:
+        other_inbox.cancel_join_thread()
+    results.put(pickle.dumps((best, expanded, goal)))
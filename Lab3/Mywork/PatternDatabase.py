@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import heapq
+import math
+import os
+import tempfile
+import time
+from collections import deque
+from typing import Callable, Iterable
+
+import numpy as np
+
+from Search import ImplicitStateSpace, Searcher, StateSpace, vacuum_heuristic, vacuum_successors
+
+
+# Cost of an abstract state from which no abstract goal can be reached (as in PolicyTable),
+# and of a rank no abstract state reached from the initial state has
+dead_end = -1
+unreached = -2
+
+
+class PatternDatabase:
+    def __init__(self, state_space: StateSpace, abstraction: Callable[[object], object], rank: Callable[[object], int],
+                 size: int, initial_state, goal_states: Iterable, path: str = None,
+                 counted: Callable[[object, object], bool] = None):
+        """
+        Heuristic from an abstraction of a state space. abstraction maps every state to an abstract state,
+        which the state space must be able to expand, so that the successors of an abstract state are the abstractions
+        of the successors of the states it stands for (e.g. a vacuum state with '*' for the statuses left out).
+        rank numbers the abstract states, every abstract state gets its own int in range(size).
+
+        The abstract states reachable from the abstraction of initial_state are found by breadth-first search,
+        and the cheapest cost from each of them to an abstract goal by Dijkstra's algorithm,
+        backwards over the abstract edges. The costs are stored in one int16 array indexed by rank,
+        so the step costs must be integers (dead_end and unreached mark the states without a cost).
+        If counted is given, abstract edges (state, child) it returns False for cost 0 in this database,
+        which is how the cost of a path is split up over additive databases.
+        If path is given, the costs are saved there (.npy) and memory mapped on the next run.
+        """
+        self.abstraction = abstraction
+        self.rank = rank
+        if path is not None and os.path.exists(path):
+            self.costs = np.load(path, mmap_mode='r')
+            if self.costs.dtype != np.int16 or self.costs.shape != (size,):
+                raise Exception(f"The pattern database in {path} does not belong to this abstraction")
+            return
+
+        sources, targets, edge_costs, reached = self.abstract_edges(state_space, abstraction(initial_state), size,
+                                                                    counted)
+        goals = [goal for goal in {rank(abstraction(goal)) for goal in goal_states} if reached[goal]]
+        costs = self.backward_costs(sources, targets, edge_costs, goals, size)
+        if costs[np.isfinite(costs)].max(initial=0) > np.iinfo(np.int16).max:
+            raise Exception("The abstract costs do not fit in an int16")
+        costs = np.where(np.isfinite(costs), costs, dead_end).astype(np.int16)
+        costs[~reached] = unreached
+
+        if path is None:
+            self.costs = costs
+            return
+        np.save(path, costs)
+        self.costs = np.load(path, mmap_mode='r')
+
+    def abstract_edges(self, state_space: StateSpace, root, size: int,
+                       counted: Callable[[object, object], bool] = None) \
+            -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Finds the abstract states reachable from root, and returns their edges as (source, target, cost) arrays
+        of ranks, with a mask of the reached ranks. Edges from a state to itself are left out,
+        they are never on a cheapest path"""
+        reached = np.zeros(size, dtype=bool)
+        reached[self.rank(root)] = True
+        sources, targets, edge_costs = [], [], []
+        fringe = deque([root])
+        while fringe:
+            state = fringe.popleft()
+            state_rank = self.rank(state)
+            for child, cost in state_space.successor(state):
+                if child == state:
+                    continue
+                if int(cost) != cost or cost < 0:
+                    raise Exception(f"Pattern databases need non-negative integer step costs, not {cost}")
+                child_rank = self.rank(child)
+                if not reached[child_rank]:
+                    reached[child_rank] = True
+                    fringe.append(child)
+                sources.append(state_rank)
+                targets.append(child_rank)
+                edge_costs.append(cost if counted is None or counted(state, child) else 0)
+        return (np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64),
+                np.array(edge_costs, dtype=np.int64), reached)
+
+    def backward_costs(self, sources: np.ndarray, targets: np.ndarray, edge_costs: np.ndarray,
+                       goals: list[int], size: int) -> np.ndarray:
+        """Dijkstra's algorithm from the goals over the reversed edges, kept in compressed sparse row form
+        (after sorting the edges by target, the edges into rank i are offsets[i]:offsets[i + 1]).
+        Ranks that can't reach a goal cost inf"""
+        order = np.argsort(targets, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(targets, minlength=size))))
+        sources, edge_costs = sources[order].tolist(), edge_costs[order].tolist()
+        offsets = offsets.tolist()
+
+        costs = [np.inf] * size
+        queue = []
+        for goal in goals:
+            costs[goal] = 0
+            queue.append((0, goal))
+        heapq.heapify(queue)
+        while queue:
+            cost, state = heapq.heappop(queue)
+            if cost > costs[state]:
+                continue
+            for edge in range(offsets[state], offsets[state + 1]):
+                new_cost = cost + edge_costs[edge]
+                if new_cost < costs[sources[edge]]:
+                    costs[sources[edge]] = new_cost
+                    heapq.heappush(queue, (new_cost, sources[edge]))
+        return np.array(costs, dtype=np.float64)
+
+    def heuristic(self, state) -> float:
+        """The abstract cost to the goal (0 for states whose abstraction was not reached when the database was built)"""
+        cost = int(self.costs[self.rank(self.abstraction(state))])
+        if cost == unreached:
+            return 0
+        return math.inf if cost == dead_end else cost
+
+
+def max_heuristic(databases: list[PatternDatabase]) -> Callable[[object], float]:
+    """The largest estimate of the databases, admissible for any abstractions"""
+    return lambda state: max(database.heuristic(state) for database in databases)
+
+
+def additive_heuristic(databases: list[PatternDatabase]) -> Callable[[object], float]:
+    """The sum of the estimates of the databases. Only admissible if the cost of every edge is counted by at most
+    one of the databases (it is an edge to the same abstract state, or not counted, in all others)"""
+    return lambda state: sum(database.heuristic(state) for database in databases)
+
+
+def vacuum_abstraction(pattern: Iterable[int]) -> Callable[[tuple], tuple]:
+    """Abstraction for vacuum_successors states that keeps the location and the statuses of the pattern locations
+    (by index), and replaces the other statuses with '*' (which is never sucked)"""
+    pattern = set(pattern)
+
+    def abstraction(state: tuple) -> tuple:
+        location, *statuses = state
+        return location, *(status if i in pattern else '*' for i, status in enumerate(statuses))
+
+    return abstraction
+
+
+def is_suck(state: tuple, child: tuple) -> bool:
+    """vacuum_successors only stays on the same location when it sucks"""
+    return state[0] == child[0]
+
+
+def vacuum_rank(locations: int, pattern: Iterable[int]) -> tuple[Callable[[tuple], int], int]:
+    """Rank for the abstract states of vacuum_abstraction(pattern) in a row of locations, and the number of ranks:
+    the index of the location, followed by one bit per pattern location (by index) that is set if it is dirty"""
+    pattern = sorted(pattern)
+
+    def rank(state: tuple) -> int:
+        location, *statuses = state
+        out = ord(location) - ord('A')
+        for i in pattern:
+            out = out << 1 | (statuses[i] == 'Dirty')
+        return out
+
+    return rank, locations << len(pattern)
+
+
+if __name__ == '__main__':
+    size = 12
+    initial_state, goal_state = ('A', *['Dirty'] * size), (chr(ord('A') + size - 1), *['Clean'] * size)
+    state_space = ImplicitStateSpace(vacuum_successors)
+    halves = [range(0, size // 2), range(size // 2, size)]
+
+    def half_database(half: range, path: str = None, counted: Callable[[tuple, tuple], bool] = None) \
+            -> PatternDatabase:
+        return PatternDatabase(state_space, vacuum_abstraction(half), *vacuum_rank(size, half), initial_state,
+                               [goal_state], path, counted)
+
+    start_time = time.perf_counter_ns()
+    location_databases = [half_database(half) for half in halves]
+    # The first database counts the moves and its own sucks, the second only its own sucks,
+    # and the sucks on the other half are edges to the same abstract state, so every edge is counted once
+    split_databases = [half_database(halves[0]), half_database(halves[1], counted=is_suck)]
+    end_time = time.perf_counter_ns()
+    print(f"Vacuum world with {size} locations, pattern databases built in {(end_time - start_time) / 10 ** 6} ms")
+
+    heuristics = {
+        "Dirt count": vacuum_heuristic,
+        "Sum of two databases (moves counted once)": additive_heuristic(split_databases),
+        "Max of two location databases": max_heuristic(location_databases),
+    }
+    for name, heuristic in heuristics.items():
+        searcher = Searcher(initial_state, (goal_state,), state_space=state_space, heuristics=heuristic,
+                            verbose=False)
+        start_time = time.perf_counter_ns()
+        path = searcher.weighted_A_star_graph(1)
+        end_time = time.perf_counter_ns()
+        print(f"{name}: cost {path[0].path_cost} with {searcher.expanded_count} expansions "
+              f"in {(end_time - start_time) / 10 ** 6} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "vacuum_first_half.npy")
+        for step in ["Built and saved", "Memory mapped"]:
+            start_time = time.perf_counter_ns()
+            database = half_database(halves[0], path)
+            end_time = time.perf_counter_ns()
+            print(f"{step} a database of {database.costs.size} abstract states ({database.costs.nbytes} bytes) "
+                  f"in {(end_time - start_time) / 10 ** 6} ms")
+            del database
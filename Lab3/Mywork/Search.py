@@ -1,5 +1,12 @@
 from __future__ import annotations
 
+import heapq
+import time
+from typing import Callable, Iterable
+
+from Fringe import BucketFringe
+from ParallelSearch import SearchProblem, hda_star
+
 
 class Node:
     def __init__(self, state, parent: Node = None, depth: int = 0, path_cost: int = 0, heuristic: int = 0,
@@ -37,53 +44,99 @@ class Node:
         return f"State: {self.state} - Depth: {self.depth} - Path cost: {self.path_cost} - Heuristic: {self.heuristic} - Weighted sum: {self.wighted_sum(self.alpha)}"
 
 
-def insert(node: Node, queue: list[Node], alpha: float = 1) -> list[Node]:
-    """Returns a copy of the queue with the node inserted (the fringe).
+class StateSpace:
+    def __init__(self, state_space: dict = None):
+        self.state_space = state_space
 
-    The queue must be ordered already (essentially means built by this function)"""
-    out = queue.copy()
-    for i in range(0, len(queue)):
-        if node.compare(out[i], alpha) < 0:
-            out.insert(i, node)
-            return out
-    out.insert(len(queue), node)
-    return out
+    def successor(self, state: str):
+        if self.state_space is None:
+            raise Exception("No state space set")
 
+        return self.state_space[state]
 
-def insert_all(in_list: list[Node], queue: list, alpha: float = 1) -> list[Node]:
-    """Inserts all nodes from the input list, into the queue using the insert function defined in this script"""
-    for node in in_list:
-        queue = insert(node, queue, alpha)
 
-    return queue
+class ImplicitStateSpace(StateSpace):
+    def __init__(self, successor_fn: Callable[[object], Iterable[tuple]]):
+        """
+        A state space that is never written out as a dict.
+        successor_fn lazily yields the (child state, cost to child) tuples of a state when it is expanded,
+        so only the states a search actually reaches are ever created.
+        """
+        super().__init__()
+        self.successor_fn = successor_fn
 
+    def successor(self, state) -> Iterable[tuple]:
+        return self.successor_fn(state)
 
-def remove_first(queue: list[Node]) -> Node:
-    """Removes and returns the first element from the input list"""
-    return queue.pop(0)
 
+def vacuum_successors(state: tuple):
+    """Successor function for the vacuum world, the state is (location, A status, B status, ...).
 
-class StateSpace:
-    def __init__(self, state_space: dict = None):
-        self.state_space = state_space
+    Works for a row of any number of locations (named 'A', 'B', ...), every action costs 1.
+    Yields the states after Suck, Left and Right, leaving out the actions that do not change the state"""
+    location, *statuses = state
+    index = ord(location) - ord('A')
+    if statuses[index] == 'Dirty':
+        yield (location, *statuses[:index], 'Clean', *statuses[index + 1:]), 1
+    if index > 0:
+        yield (chr(ord(location) - 1), *statuses), 1
+    if index < len(statuses) - 1:
+        yield (chr(ord(location) + 1), *statuses), 1
 
-    def successor(self, state: str):
-        if self.state_space is None:
-            raise Exception("No state space set")
 
-        return self.state_space[state]
+def vacuum_heuristic(state: tuple) -> int:
+    """Every dirty location needs at least one Suck"""
+    return state.count('Dirty')
+
+
+def farmer_is_safe(state: tuple) -> bool:
+    """Returns False if the wolf can eat the goat or the goat can eat the cabbage (farmer, wolf, goat, cabbage)"""
+    farmer, wolf, goat, cabbage = state
+    return not (wolf == goat != farmer or goat == cabbage != farmer)
+
+
+def farmer_successors(state: tuple):
+    """Successor function for the farmer, wolf, goat and cabbage puzzle, the state is (farmer, wolf, goat, cabbage).
+
+    The farmer crosses alone or with one passenger from his side of the river, every crossing costs 1.
+    Only safe states are yielded"""
+    other_side = 'E' if state[0] == 'W' else 'W'
+    for passenger in range(len(state)):
+        if state[passenger] != state[0]:
+            continue
+        child = tuple(other_side if i in (0, passenger) else side for i, side in enumerate(state))
+        if farmer_is_safe(child):
+            yield child, 1
+
+
+def farmer_heuristic(state: tuple) -> int:
+    """Every crossing to the east bank carries at most one passenger"""
+    return state[1:].count('W')
 
 
 class Searcher:
-    def __init__(self, initial_state, goal_state: tuple | str, state_space: StateSpace = None, heuristics: dict = None):
+    def __init__(self, initial_state, goal_state: tuple | str, state_space: StateSpace = None,
+                 heuristics: dict | Callable[[object], float] = None, verbose: bool = True):
+        """heuristics is either a dict from state to heuristic, or a function computing it (implicit state spaces).
+
+        Printing the fringe after every expansion is O(fringe), so set verbose to False for large searches"""
         self.initial_state = initial_state
         self.goal_state: tuple = goal_state if type(goal_state) == tuple else tuple(goal_state)
         self.state_space = state_space
         self.heuristics = heuristics
+        self.verbose = verbose
+        self.expanded_count = 0
+        self.avoided_count = 0
+        self.reopened_count = 0
+        self.iteration_count = 0
+        self.generated_count = 0
+        self.beam_width = 0
 
     def get_heuristic(self, state: str):
         if self.heuristics is None:
             raise Exception("No heuristics set")
+        if callable(self.heuristics):
+            return self.heuristics(state)
         return self.heuristics[state]
 
     def expand_node(self, node: Node, alpha: float) -> list[Node]:
@@ -94,24 +147,256 @@ class Searcher:
             cost_to_child = child[1]
             s = Node(child_state, node, node.depth + 1, node.path_cost + cost_to_child, self.get_heuristic(child_state),
                      alpha)
-            successors = insert(s, successors)
+            successors.append(s)
 
+        # Children with the same weighted sum are inserted in the order of their (unweighted) A-star cost
+        successors.sort(key=lambda successor: successor.wighted_sum(1))
         return successors
 
     def weighted_A_star(self, weight_alpha: float) -> list[Node]:
-        fringe = []
+        fringe = BucketFringe(weight_alpha, Node.wighted_sum)
         initial_node = Node(self.initial_state, path_cost=0, heuristic=self.get_heuristic(self.initial_state),
                             alpha=weight_alpha)
-        fringe = insert(initial_node, fringe, weight_alpha)
+        fringe.insert(initial_node)
         fringe_count = 0
-        while fringe is not None:
-            node = remove_first(fringe)
+        while fringe:
+            node = fringe.remove_first()
             if node.state in self.goal_state:
+                self.expanded_count = fringe_count
                 return node.path()
             children = self.expand_node(node, weight_alpha)
-            fringe = insert_all(children, fringe, weight_alpha)
+            fringe.insert_all(children)
             fringe_count += 1
-            print(f"Fringe {fringe_count}: {fringe}")
+            if self.verbose:
+                print(f"Fringe {fringe_count}: {fringe}")
+
+        self.expanded_count = fringe_count
+        return []
+
+    def weighted_A_star_graph(self, weight_alpha: float, reopen_closed: bool = True) -> list[Node]:
+        """Same as weighted_A_star, but a state is only expanded again if it is reached by a cheaper path.
+
+        The cheapest path cost found to every state is kept in a dict. Children that are no cheaper are dropped,
+        and fringe entries that were superseded by a cheaper path are skipped when they are removed (lazy deletion).
+        If reopen_closed is True an expanded state is put back in the fringe when a cheaper path to it is found,
+        which is needed for optimal paths when the heuristic is admissible but not consistent.
+
+        Stores the number of expanded nodes in expanded_count, the number of dropped children and skipped entries
+        in avoided_count, and the number of reopened states in reopened_count"""
+        fringe = BucketFringe(weight_alpha, Node.wighted_sum)
+        initial_node = Node(self.initial_state, path_cost=0, heuristic=self.get_heuristic(self.initial_state),
+                            alpha=weight_alpha)
+        fringe.insert(initial_node)
+        best_path_cost = {initial_node.state: 0}
+        closed = set()
+        self.expanded_count = 0
+        self.avoided_count = 0
+        self.reopened_count = 0
+        while fringe:
+            node = fringe.remove_first()
+            if node.path_cost > best_path_cost[node.state]:
+                self.avoided_count += 1
+                continue
+            if node.state in self.goal_state:
+                return node.path()
+            closed.add(node.state)
+            for child in self.expand_node(node, weight_alpha):
+                if child.path_cost >= best_path_cost.get(child.state, float('inf')):
+                    self.avoided_count += 1
+                    continue
+                if child.state in closed:
+                    if not reopen_closed:
+                        self.avoided_count += 1
+                        continue
+                    closed.remove(child.state)
+                    self.reopened_count += 1
+                best_path_cost[child.state] = child.path_cost
+                fringe.insert(child)
+            self.expanded_count += 1
+            if self.verbose:
+                print(f"Fringe {self.expanded_count}: {fringe}")
+
+        return []
+
+    def ida_star(self, weight_alpha: float = 1) -> list[Node]:
+        """Iterative deepening A-star: repeated depth-first searches that only visit nodes whose weighted sum is
+        within a threshold. The first threshold is the weighted sum of the initial node, every following threshold
+        is the smallest weighted sum that was above the previous one.
+
+        Only the current path is kept in memory, and with alpha 1 (and an admissible heuristic) the path is optimal.
+        Stores the number of thresholds tried in iteration_count and of generated nodes in generated_count"""
+        root = Node(self.initial_state, path_cost=0, heuristic=self.get_heuristic(self.initial_state),
+                    alpha=weight_alpha)
+        threshold = root.wighted_sum(weight_alpha)
+        self.iteration_count = 0
+        self.generated_count = 1
+        while True:
+            self.iteration_count += 1
+            path, next_threshold = self.threshold_search(root, threshold, weight_alpha)
+            if self.verbose:
+                print(f"Threshold {threshold}: {self.generated_count} nodes generated so far")
+            if path or next_threshold == float('inf'):
+                return path
+            threshold = next_threshold
+
+    def threshold_search(self, root: Node, threshold: float, alpha: float) -> tuple[list[Node], float]:
+        """Depth-first search below root, that skips states already on the current path and nodes with a weighted sum
+        above threshold.
+
+        Returns a tuple containing:
+        (path to a goal or [], the smallest weighted sum above the threshold that was seen)"""
+        next_threshold = float('inf')
+        if root.state in self.goal_state:
+            return root.path(), next_threshold
+
+        on_path = {root.state}
+        stack = [(root, iter(self.expand_node(root, alpha)))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if child.state in on_path:
+                    continue
+                self.generated_count += 1
+                weighted_sum = child.wighted_sum(alpha)
+                if weighted_sum > threshold:
+                    next_threshold = min(next_threshold, weighted_sum)
+                    continue
+                if child.state in self.goal_state:
+                    return child.path(), next_threshold
+                on_path.add(child.state)
+                stack.append((child, iter(self.expand_node(child, alpha))))
+                break
+            else:
+                stack.pop()
+                on_path.discard(node.state)
+
+        return [], next_threshold
+
+    def anytime_A_star(self, alphas: Iterable[float] = (1000, 2.5, 1.5, 1.2, 1), time_limit: float = None):
+        """Anytime repairing A-star (ARA*): a weighted A-star for each alpha in turn, that reuses the search so far.
+
+        The cheapest node found for every state is kept between the alphas. States that get a cheaper path after they
+        were expanded are not expanded again for the current alpha, but are kept as inconsistent and put back
+        in the fringe (with the rest of the fringe) when alpha is lowered.
+        Each search stops when no node in the fringe has a lower weighted sum than the cost of the best goal found.
+
+        After every alpha this yields a tuple containing:
+        (alpha, path to the best goal found so far, bound on how many times costlier it is than the optimal path)
+        Stops early when the path is proven optimal. When time_limit seconds have passed, the search for the current
+        alpha is interrupted (between two expansions), and the best goal so far is yielded one last time.
+        The total number of expanded nodes is stored in expanded_count"""
+        start_time = time.perf_counter()
+        alphas = list(alphas)
+        root = Node(self.initial_state, path_cost=0, heuristic=self.get_heuristic(self.initial_state),
+                    alpha=alphas[0])
+        best_node = {root.state: root}
+        goal_node = root if root.state in self.goal_state else None
+        open_states = {root.state}
+        inconsistent = set()
+        bound = float('inf')
+        self.expanded_count = 0
+        for alpha in alphas:
+            open_states |= inconsistent
+            inconsistent = set()
+            closed = set()
+            fringe = BucketFringe(alpha, Node.wighted_sum)
+            fringe.insert_all(best_node[state] for state in open_states)
+
+            timed_out = False
+            while fringe:
+                if time_limit is not None and time.perf_counter() - start_time > time_limit:
+                    timed_out = True
+                    break
+                node = fringe.first()
+                if node.state not in open_states or best_node[node.state] is not node:
+                    fringe.remove_first()  # Superseded by a cheaper node, or already expanded
+                    continue
+                if goal_node is not None and node.wighted_sum(alpha) >= goal_node.path_cost:
+                    break
+                fringe.remove_first()
+                open_states.remove(node.state)
+                closed.add(node.state)
+                self.expanded_count += 1
+                for child in self.expand_node(node, alpha):
+                    if child.state in best_node and child.path_cost >= best_node[child.state].path_cost:
+                        continue
+                    best_node[child.state] = child
+                    if child.state in self.goal_state and (goal_node is None or
+                                                           child.path_cost < goal_node.path_cost):
+                        goal_node = child
+                    if child.state in closed:
+                        inconsistent.add(child.state)
+                    else:
+                        open_states.add(child.state)
+                        fringe.insert(child)
+
+            if goal_node is None:
+                yield alpha, [], float('inf')
+            else:
+                # No path can be cheaper than the lowest unweighted sum among the states that are not expanded,
+                # and only a search that ran to the end for alpha proves the path is at most alpha times too costly
+                lowest_sum = min((best_node[state].wighted_sum(1) for state in open_states | inconsistent),
+                                 default=float('inf'))
+                if lowest_sum > 0:
+                    bound = min(bound, goal_node.path_cost / lowest_sum)
+                if not timed_out:
+                    bound = min(bound, alpha)
+                bound = max(1.0, bound)
+                yield alpha, goal_node.path(), bound
+                if bound <= 1:
+                    return
+
+            if timed_out or time_limit is not None and time.perf_counter() - start_time > time_limit:
+                return
+
+    def beam_search(self, weight_alpha: float = 1, beam_width: int = 2, max_beam_width: int = None,
+                    max_depth: int = 1000) -> list[Node]:
+        """Searches one depth at a time, keeping only the beam_width nodes with the lowest weighted sum of each depth,
+        so at most beam_width times the branching factor nodes are in memory, however large the state space is.
+
+        If the beam runs empty (or max_depth is reached) without a goal, and max_beam_width is set,
+        the search is retried with twice the beam width, up to max_beam_width.
+        The beam width that was last used is stored in beam_width, and the number of expanded nodes in expanded_count"""
+        self.expanded_count = 0
+        while True:
+            self.beam_width = beam_width
+            path = self.beam_search_pass(weight_alpha, beam_width, max_depth)
+            if path or max_beam_width is None or beam_width >= max_beam_width:
+                return path
+            beam_width = min(beam_width * 2, max_beam_width)
+            if self.verbose:
+                print(f"No goal found, widening the beam to {beam_width}")
+
+    def beam_search_pass(self, alpha: float, beam_width: int, max_depth: int) -> list[Node]:
+        beam = [Node(self.initial_state, path_cost=0, heuristic=self.get_heuristic(self.initial_state), alpha=alpha)]
+        for _ in range(max_depth + 1):
+            goals = [node for node in beam if node.state in self.goal_state]
+            if goals:
+                return min(goals, key=lambda goal: goal.path_cost).path()
+
+            # The cheapest node of every state at the next depth
+            candidates = {}
+            for node in beam:
+                self.expanded_count += 1
+                for child in self.expand_node(node, alpha):
+                    if child.state not in candidates or child.path_cost < candidates[child.state].path_cost:
+                        candidates[child.state] = child
+            beam = heapq.nsmallest(beam_width, candidates.values(), key=lambda candidate: candidate.wighted_sum(alpha))
+            if self.verbose:
+                print(f"Beam {beam}")
+            if not beam:
+                return []
+
+        return []
+
+    def parallel_A_star(self, weight_alpha: float = 1, workers: int = 4) -> list[Node]:
+        """Same as weighted_A_star_graph, but run by hda_star in workers processes that each own part of the states.
+        Stores the number of expanded nodes (over all workers) in expanded_count"""
+        path, _, self.expanded_count = hda_star(SearcherProblem(self), workers, weight_alpha)
+        node = None
+        for depth, (state, _, cost) in enumerate(path):
+            node = Node(state, node, depth, cost, self.get_heuristic(state), weight_alpha)
+        return [] if node is None else node.path()
 
     def A_star(self) -> list[Node]:
         """Search the tree for the goal state
@@ -131,38 +416,58 @@ class Searcher:
         print("-" * 100 + "\n")
 
 
-if __name__ == '__main__':
-    # Tuple format = ('Node_name', cost to this node)
-    input_state_space = {
-        'A': [('B', 1), ('C', 2), ('D', 4)],
-        'B': [('F', 5), ('E', 4)],
-        'C': [('E', 1)],
-        'D': [('H', 1), ('I', 4), ('J', 2)],
-        'E': [('G', 2), ('H', 3)],
-        'F': [('G', 1)],
-        'G': [('K', 6)],
-        'H': [('K', 6), ('L', 5)],
-        'I': [('L', 3)],
-        'J': [],
-        'K': [],
-        'L': [],
-    }
+class SearcherProblem(SearchProblem):
+    def __init__(self, searcher: Searcher):
+        """The state space, heuristics and goals of a Searcher, as a SearchProblem for hda_star"""
+        self.searcher = searcher
+
+    def initial_state(self):
+        return self.searcher.initial_state
+
+    def is_goal(self, state) -> bool:
+        return state in self.searcher.goal_state
+
+    def heuristic(self, state) -> float:
+        return self.searcher.get_heuristic(state)
+
+    def successors(self, state) -> Iterable[tuple]:
+        for child, cost in self.searcher.state_space.successor(state):
+            yield child, None, cost, self.searcher.get_heuristic(child)
+
+
+# Tuple format = ('Node_name', cost to this node)
+input_state_space = {
+    'A': [('B', 1), ('C', 2), ('D', 4)],
+    'B': [('F', 5), ('E', 4)],
+    'C': [('E', 1)],
+    'D': [('H', 1), ('I', 4), ('J', 2)],
+    'E': [('G', 2), ('H', 3)],
+    'F': [('G', 1)],
+    'G': [('K', 6)],
+    'H': [('K', 6), ('L', 5)],
+    'I': [('L', 3)],
+    'J': [],
+    'K': [],
+    'L': [],
+}
+
+input_heuristics = {
+    'A': 6,
+    'B': 5,
+    'C': 5,
+    'D': 2,
+    'E': 4,
+    'F': 5,
+    'G': 4,
+    'H': 1,
+    'I': 2,
+    'J': 1,
+    'K': 0,
+    'L': 0,
+}
 
-    input_heuristics = {
-        'A': 6,
-        'B': 5,
-        'C': 5,
-        'D': 2,
-        'E': 4,
-        'F': 5,
-        'G': 4,
-        'H': 1,
-        'I': 2,
-        'J': 1,
-        'K': 0,
-        'L': 0,
-    }
 
+if __name__ == '__main__':
     searcher = Searcher('A', ('K', 'L'), state_space=StateSpace(input_state_space), heuristics=input_heuristics)
     searcher.show_path(searcher.A_star())
     searcher.show_path(searcher.greedy_BFS())
@@ -185,6 +490,68 @@ if __name__ == '__main__':
     print("Weighted A-star 2.5")
     searcher.show_path(searcher.weighted_A_star(2.5))
 
+    print("Farmer world (implicit)")
+    searcher = Searcher(('W', 'W', 'W', 'W'), (('E', 'E', 'E', 'E'),),
+                        state_space=ImplicitStateSpace(farmer_successors), heuristics=farmer_heuristic)
+    searcher.show_path(searcher.A_star())
+
+    print("Anytime repairing A-star")
+    for goal in [('K', 'L'), ('K',)]:
+        searcher = Searcher('A', goal, state_space=StateSpace(input_state_space), heuristics=input_heuristics,
+                            verbose=False)
+        for alpha, path, bound in searcher.anytime_A_star():
+            print(f"Goal {goal} alpha {alpha}: path {'-'.join(node.state for node in reversed(path))} - "
+                  f"cost {path[0].path_cost} - at most {bound} times the optimal cost - "
+                  f"{searcher.expanded_count} nodes expanded so far")
+
+    print("Beam search")
+    for goal in [('K', 'L'), ('K',)]:
+        searcher = Searcher('A', goal, state_space=StateSpace(input_state_space), heuristics=input_heuristics,
+                            verbose=False)
+        searcher.show_path(searcher.beam_search(1, beam_width=1, max_beam_width=8))
+        print(f"Beam width {searcher.beam_width}, {searcher.expanded_count} nodes expanded")
+
+    print("IDA-star")
+    for goal in [('K', 'L'), ('K',)]:
+        searcher = Searcher('A', goal, state_space=StateSpace(input_state_space), heuristics=input_heuristics)
+        searcher.show_path(searcher.ida_star(1))
+        print(f"{searcher.iteration_count} thresholds, {searcher.generated_count} nodes generated")
+
+    print("A-star with and without duplicate detection")
+    searchers = {
+        "Farmer world": Searcher(('W', 'W', 'W', 'W'), (('E', 'E', 'E', 'E'),),
+                                 state_space=ImplicitStateSpace(farmer_successors), heuristics=farmer_heuristic,
+                                 verbose=False),
+        "Vacuum world with 5 locations": Searcher(('A', *['Dirty'] * 5), (('E', *['Clean'] * 5),),
+                                                  state_space=ImplicitStateSpace(vacuum_successors),
+                                                  heuristics=vacuum_heuristic, verbose=False),
+    }
+    for name, searcher in searchers.items():
+        tree_path = searcher.weighted_A_star(1)
+        tree_expanded = searcher.expanded_count
+        graph_path = searcher.weighted_A_star_graph(1)
+        print(f"{name}: cost {tree_path[0].path_cost} with {tree_expanded} expansions, "
+              f"cost {graph_path[0].path_cost} with {searcher.expanded_count} expansions using duplicate detection "
+              f"(avoided {searcher.avoided_count}, reopened {searcher.reopened_count})")
+
+    print("Hash distributed A-star")
+    for goal in [('K', 'L'), ('K',)]:
+        searcher = Searcher('A', goal, state_space=StateSpace(input_state_space), heuristics=input_heuristics,
+                            verbose=False)
+        for workers in [1, 2, 4]:
+            path = searcher.parallel_A_star(1, workers)
+            print(f"Goal {goal} with {workers} workers: path {'-'.join(node.state for node in reversed(path))} - "
+                  f"cost {path[0].path_cost} - {searcher.expanded_count} nodes expanded")
+
+    searcher = Searcher(('A', *['Dirty'] * 10), (('J', *['Clean'] * 10),),
+                        state_space=ImplicitStateSpace(vacuum_successors), heuristics=vacuum_heuristic, verbose=False)
+    for workers in [1, 2, 4, 8]:
+        start_time = time.perf_counter_ns()
+        path = searcher.parallel_A_star(1, workers)
+        end_time = time.perf_counter_ns()
+        print(f"Vacuum world with 10 locations, {workers} workers: cost {path[0].path_cost} - "
+              f"{searcher.expanded_count} nodes expanded in {(end_time - start_time) / 10 ** 6} ms")
+
     # vacuum_space = {
     #     ('A', 'Dirty', 'Dirty'): [('A', 'Clean', 'Dirty'), ('A', 'Dirty', 'Dirty'), ('B', 'Dirty', 'Dirty')],
     #     ('B', 'Dirty', 'Dirty'): [('B', 'Dirty', 'Clean'), ('A', 'Dirty', 'Dirty'), ('B', 'Dirty', 'Dirty')],
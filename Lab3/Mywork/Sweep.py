@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Search import Searcher, StateSpace, input_heuristics, input_state_space
+
+results_directory = os.path.dirname(os.path.abspath(__file__))
+
+
+def algorithm_name(alpha: float) -> str:
+    if alpha == 1:
+        return "A-Star"
+    if alpha >= 1000:
+        return f"Greedy (GBFS) (Alpha {alpha})"
+    return f"Weighted A-Star (Alpha {alpha})"
+
+
+def run_search(initial_state, state_space: dict, heuristics: dict, goal: tuple, alpha: float) -> dict:
+    """Runs weighted A-star for one (goal, alpha) pair, and returns what goes in a row of the results"""
+    searcher = Searcher(initial_state, goal, state_space=StateSpace(state_space), heuristics=heuristics,
+                        verbose=False)
+    path = searcher.weighted_A_star(alpha)
+    path.reverse()
+    return {
+        'algorithm': algorithm_name(alpha),
+        'goal': f"({', '.join(goal)})",
+        'alpha': alpha,
+        'path': '-'.join(str(node.state) for node in path),
+        'cost': path[-1].path_cost if path else -1,
+        'explored': searcher.expanded_count,
+    }
+
+
+def sweep(initial_state, state_space: dict, heuristics: dict, grid: list[tuple[tuple, float]],
+          processes: int = None) -> list[dict]:
+    """Runs weighted A-star for every (goal set, alpha) pair of the grid in a pool of processes
+    (one per core if processes is None), and returns the results in the order of the grid"""
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(run_search, initial_state, state_space, heuristics, goal, alpha)
+                   for goal, alpha in grid]
+        return [future.result() for future in futures]
+
+
+def markdown_table(results: list[dict]) -> str:
+    header = ("Algorithm", "Goal", "Path", "Cost", "Number of explored nodes")
+    rows = [(r['algorithm'], r['goal'], r['path'], str(r['cost']), str(r['explored'])) for r in results]
+    widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+
+    def format_row(row: tuple) -> str:
+        return "| " + " | ".join(cell.ljust(width) for cell, width in zip(row, widths)) + " |"
+
+    separator = "|" + "|".join("-" * (width + 2) for width in widths) + "|"
+    return "\n".join([format_row(header), separator, *[format_row(row) for row in rows]]) + "\n"
+
+
+def write_markdown(results: list[dict], path: str) -> None:
+    """Writes the results table at the top of the markdown file, replacing the table that is already there
+    and keeping the rest of the file"""
+    rest = ""
+    if os.path.exists(path):
+        with open(path) as file:
+            lines = file.readlines()
+        while lines and lines[0].startswith("|"):
+            lines.pop(0)
+        rest = "".join(lines)
+    with open(path, 'w') as file:
+        file.write(markdown_table(results) + rest)
+
+
+def write_csv(results: list[dict], path: str) -> None:
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == '__main__':
+    goals = [('K',), ('L',), ('K', 'L')]
+    alphas = [1, 1000, 1.2, 1.5, 2.5]
+    alpha_grid = [(goal, alpha) for alpha in alphas for goal in goals]
+
+    start_time = time.perf_counter_ns()
+    sweep_results = sweep('A', input_state_space, input_heuristics, alpha_grid)
+    end_time = time.perf_counter_ns()
+    print(markdown_table(sweep_results))
+    print(f"{len(alpha_grid)} searches in {(end_time - start_time) / 10 ** 6} ms")
+
+    write_markdown(sweep_results, os.path.join(results_directory, "Results.md"))
+    write_csv(sweep_results, os.path.join(results_directory, "Results.csv"))
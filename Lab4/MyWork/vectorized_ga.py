@@ -0,0 +1,183 @@
+import contextlib
+import io
+import random
+import time
+
+import numpy as np
+
+from Lab4.MyWork import n_queens
+from Lab4.MyWork.n_queens import num_of_generations, p_mutation, p_value_mutation, population_size, print_population
+from Lab4.queens_fitness import fitness_fn_negative
+
+
+def queens_fitness(population: np.ndarray) -> np.ndarray:
+    '''
+    fitness_fn_negative for every row of the population at once:
+    the number of pairs of queens on the same row or diagonal, negated
+    '''
+    conflicts = np.zeros(len(population), dtype=np.int64)
+    # Every pair of columns d apart, for all rows and all such pairs at once
+    for d in range(1, population.shape[1]):
+        dy = np.abs(population[:, :-d] - population[:, d:])
+        conflicts += np.count_nonzero((dy == 0) | (dy == d), axis=1)
+    return -conflicts
+
+
+# Fitness functions that have a version working on the whole population at once
+vectorized_fitness = {
+    fitness_fn_negative: queens_fitness,
+}
+
+
+def population_fitness(population: np.ndarray, fitness_fn) -> np.ndarray:
+    '''
+    Returns the fitness of every row, with the vectorized version of fitness_fn if there is one,
+    otherwise by calling fitness_fn on every individual (as a tuple)
+    '''
+    if fitness_fn in vectorized_fitness:
+        return vectorized_fitness[fitness_fn](population)
+    return np.array([fitness_fn(tuple(individual)) for individual in population.tolist()])
+
+
+def random_selection(fitness: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Roulette wheel selection of count individuals (returns their row indices).
+    The fitness can be negative, so it is shifted to make the least fit individual weigh 1
+    '''
+    weights = fitness - fitness.min() + 1
+    wheel = np.cumsum(weights, dtype=np.float64)
+    return np.minimum(np.searchsorted(wheel, rng.random(count) * wheel[-1], side='right'), len(fitness) - 1)
+
+
+def reproduce(mothers: np.ndarray, fathers: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Single-point crossover of every row of mothers with the same row of fathers,
+    each child with its own random crossover index (genes before it come from the mother)
+    '''
+    n = mothers.shape[1]
+    crossover_index = rng.integers(1, n, size=len(mothers))
+    return np.where(np.arange(n)[None, :] < crossover_index[:, None], mothers, fathers)
+
+
+def mutate(children: np.ndarray, low: int, high: int, rng: np.random.Generator) -> np.ndarray:
+    '''
+    With probability p_mutation a child is mutated, and then every gene of it is
+    assigned a random value in [low, high] with probability p_value_mutation
+    '''
+    mutated = rng.random(len(children)) < p_mutation
+    genes = mutated[:, None] & (rng.random(children.shape) <= p_value_mutation)
+    return np.where(genes, rng.integers(low, high + 1, size=children.shape, dtype=children.dtype), children)
+
+
+def unique_rows(population: np.ndarray, high: int) -> np.ndarray:
+    '''
+    Removes duplicate individuals. If every row fits in an int64 as a number in base high + 1,
+    rows are compared by that number, otherwise np.unique compares them gene by gene
+    '''
+    n = population.shape[1]
+    if (high + 1) ** n < 2 ** 63:
+        keys = population.astype(np.int64) @ (high + 1) ** np.arange(n, dtype=np.int64)
+        _, first = np.unique(keys, return_index=True)
+        return population[np.sort(first)]
+    return np.unique(population, axis=0)
+
+
+def trim_population(population: np.ndarray, fitness: np.ndarray, desired_length: int) \
+        -> tuple[np.ndarray, np.ndarray]:
+    '''Keeps the desired_length fittest individuals (and their fitness)'''
+    if len(population) <= desired_length:
+        return population, fitness
+    fittest = np.argpartition(-fitness, desired_length - 1)[:desired_length]
+    return population[fittest], fitness[fittest]
+
+
+def evolve(population: np.ndarray, fitness_fn, minimal_fitness: float, low: int, high: int,
+           size: int = population_size, rng: np.random.Generator = None) -> tuple[np.ndarray, np.ndarray, int]:
+    '''
+    The genetic algorithm on a 2-D array with one individual per row: every generation breeds as many children
+    as there are individuals, adds them, removes duplicates and keeps the size fittest.
+    Returns the last population, its fitness and the number of the last generation
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    # Small genes are stored as bytes, which makes every array operation on the population cheaper
+    population = population.astype(np.int8 if 0 <= low and high <= 127 else np.int64)
+    population = unique_rows(population, high)
+    fitness = population_fitness(population, fitness_fn)
+    generation = 0
+    for generation in range(num_of_generations):
+        mothers = random_selection(fitness, len(population), rng)
+        fathers = random_selection(fitness, len(population), rng)
+        children = mutate(reproduce(population[mothers], population[fathers], rng), low, high, rng)
+
+        population = unique_rows(np.concatenate((population, children)), high)
+        fitness = population_fitness(population, fitness_fn)
+        population, fitness = trim_population(population, fitness, size)
+
+        if minimal_fitness <= fitness.max():
+            break
+
+    return population, fitness, generation
+
+
+def genetic_algorithm(population: set[tuple], fitness_fn, minimal_fitness: float) -> tuple[tuple, set[tuple]]:
+    '''
+    Same interface as n_queens.genetic_algorithm, but the generations are bred by evolve on a NumPy array.
+    Genes are values from 1 to the length of an individual (a queen's row)
+    '''
+    n = len(next(iter(population)))
+    final_population, fitness, generation = evolve(np.array(sorted(population)), fitness_fn, minimal_fitness,
+                                                   1, n)
+    final_generation = set(map(tuple, final_population.tolist()))
+
+    print(f"Final generation {generation}:")
+    print_population(final_generation, fitness_fn)
+
+    return tuple(final_population[np.argmax(fitness)].tolist()), final_generation
+
+
+def main():
+    minimal_fitness = 0
+
+    initial_population = {
+        (1, 2, 3, 4, 5, 6, 7, 8),
+        (1, 1, 1, 1, 1, 1, 1, 1),
+        (2, 2, 2, 2, 2, 2, 2, 2),
+        (3, 3, 3, 3, 3, 3, 3, 3),
+        (3, 2, 7, 1, 3, 8, 2, 5),
+        (2, 2, 7, 1, 3, 8, 8, 5),
+        (2, 4, 7, 1, 3, 6, 8, 5),
+        (2, 4, 7, 1, 3, 8, 6, 8)
+    }
+
+    start_time = time.perf_counter_ns()
+    fittest, final_generation = genetic_algorithm(initial_population, fitness_fn_negative, minimal_fitness)
+    end_time = time.perf_counter_ns()
+    print(f"Fittest Individual: {fittest} - fitness: {fitness_fn_negative(fittest)}")
+    print(f"total elapsed time: {(end_time - start_time) / 10**6} ms")
+
+    rng = np.random.default_rng(0)
+    for size in [1_000, 100_000]:
+        population = rng.integers(1, 9, size=(size, 8))
+
+        if size <= 1_000:
+            start_time = time.perf_counter_ns()
+            with contextlib.redirect_stdout(io.StringIO()):
+                # One generation of the set based version (it stops after the first generation that is fit enough)
+                n_queens.genetic_algorithm(set(map(tuple, population.tolist())), fitness_fn_negative,
+                                           -10 ** 6)
+            end_time = time.perf_counter_ns()
+            print(f"Population {size}: one generation of n_queens.genetic_algorithm took "
+                  f"{(end_time - start_time) / 10**6} ms")
+
+        start_time = time.perf_counter_ns()
+        final_population, fitness, generation = evolve(population, fitness_fn_negative, minimal_fitness, 1, 8,
+                                                       size=size, rng=rng)
+        end_time = time.perf_counter_ns()
+        print(f"Population {size}: {generation + 1} generations took {(end_time - start_time) / 10**6} ms "
+              f"({(end_time - start_time) / 10**6 / (generation + 1)} ms per generation), "
+              f"best fitness {fitness.max()}")
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    main()